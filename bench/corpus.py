@@ -0,0 +1,123 @@
+# bench/corpus.py
+import random
+import string
+
+from etl.import_csv import COLUMNS
+from etl.record import Publication
+
+# Synthetic registry data shaped like the real sources: CURIS-style author
+# lists, a long-tailed journal distribution, DOIs on most records and a
+# share of cross-source duplicates with the usual DOI and title drift
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+TITLE_WORDS = (
+    "stem cell pancreatic beta differentiation organoid single-cell transcriptomic atlas human mouse "
+    "embryonic pluripotent hematopoietic progenitor lineage tracing regeneration kidney liver retina "
+    "cardiomyocyte epigenetic chromatin enhancer signalling Wnt Notch niche maturation fate decision "
+    "CRISPR screen reveals regulator development disease model therapy insulin islet endoderm "
+    "mesoderm neural crest spatial profiling multi-omic reprogramming iPSC derived functional "
+    "heterogeneity dynamics mechanism transcription factor network metabolic"
+).split()
+JOURNAL_STEMS = (
+    "Nature", "Cell", "Science", "Development", "Stem Cell Reports", "Cell Stem Cell", "eLife",
+    "Nature Communications", "Diabetes", "Developmental Cell", "EMBO Journal", "PLoS Biology",
+    "Scientific Reports", "Cell Reports", "Genes & Development", "Nucleic Acids Research",
+)
+SURNAMES = (
+    "Jensen", "Nielsen", "Hansen", "Pedersen", "Andersen", "Larsen", "Smith", "Garcia", "Müller",
+    "Rossi", "Wang", "Li", "Zhang", "Kim", "Nakamura", "Dubois", "Novak", "Silva", "Øster", "Brickman",
+)
+
+def _journals(rng, count=200):
+    # Zipf-like: a handful of journals carry most of the papers
+    names = list(JOURNAL_STEMS)
+    while len(names) < count:
+        names.append(f"{rng.choice(JOURNAL_STEMS)} {rng.choice(['Research', 'Letters', 'Advances', 'Open', 'Methods'])}")
+    weights = [1 / (rank + 1) for rank in range(len(names))]
+    return names, weights
+
+def _authors(rng):
+    count = min(int(rng.lognormvariate(1.6, 0.7)) + 1, 60)
+    names = [f"{rng.choice(SURNAMES)} {''.join(rng.choices(string.ascii_uppercase, k=rng.randint(1, 2)))}" for _ in range(count)]
+    return ", ".join(names)
+
+def _vocabulary(rng, count=4000):
+    # Domain words first, then invented ones, Zipf-weighted like real
+    # titles: a shared core vocabulary and a long tail of rare terms
+    words = list(TITLE_WORDS)
+    while len(words) < count:
+        words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))))
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+def _title(rng, vocabulary):
+    words = rng.choices(*vocabulary, k=rng.randint(6, 18))
+    words[0] = words[0].capitalize()
+    return " ".join(words)
+
+def _typo(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+def _variant(rng, pub, source):
+    # The same work as another source reports it
+    doi = pub.doi
+    if doi and rng.random() < 0.5:
+        doi = "https://doi.org/" + doi.upper()
+    elif rng.random() < 0.3:
+        doi = ""
+    title = pub.title
+    roll = rng.random()
+    if roll < 0.3:
+        title += "."
+    elif roll < 0.5:
+        title = title.replace(" ", " <i>", 1) + "</i>"
+    elif roll < 0.7:
+        title = _typo(rng, title)
+    return Publication(title=title, authors=pub.authors, journal=pub.journal, date=pub.date,
+                       doi=doi, pmid=pub.pmid if source == "EuropePMC" else "", source=source)
+
+def generate(size, duplicate_rate=0.15, seed=20250501):
+    # Returns `size` records; about duplicate_rate of them re-describe an
+    # earlier work from another source
+    rng = random.Random(seed)
+    journals, weights = _journals(rng)
+    vocabulary = _vocabulary(rng)
+    sources = ("Excel", "OpenAlex", "EuropePMC")
+    pubs = []
+    originals = []
+    while len(pubs) < size:
+        if originals and rng.random() < duplicate_rate:
+            pubs.append(_variant(rng, rng.choice(originals), rng.choice(sources)))
+            continue
+        n = len(originals)
+        year = rng.randint(2021, 2025)
+        source = rng.choice(sources)
+        pub = Publication(
+            title=_title(rng, vocabulary),
+            authors=_authors(rng),
+            journal=rng.choices(journals, weights)[0],
+            date=f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            doi=f"10.{rng.randint(1000, 99999)}/bench.{year}.{n}" if rng.random() < 0.9 else "",
+            pmid=str(30_000_000 + n) if source == "EuropePMC" else "",
+            source=source,
+        )
+        originals.append(pub)
+        pubs.append(pub)
+    return pubs
+
+def write_workbook(path, pubs, blank_rate=0.02, seed=20250501):
+    # CURIS export layout: the mapped columns plus a few unmapped ones,
+    # dd/mm/YYYY dates and the odd row without a date
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    headers = list(COLUMNS)
+    sheet.append(["Id"] + headers + ["Peer-review status", "Language"])
+    for i, pub in enumerate(pubs):
+        year, month, day = pub.date.split("-")
+        date = "" if rng.random() < blank_rate else f"{day}/{month}/{year}"
+        sheet.append([i, pub.title, pub.authors, pub.journal, date, pub.doi or None, "Peer-reviewed", "English"])
+    workbook.save(path)
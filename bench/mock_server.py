@@ -0,0 +1,323 @@
+# bench/mock_server.py
+import argparse
+import base64
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import corpus
+
+# Stand-in for the parts of the EuropePMC search API and the OpenAlex works
+# API the fetchers use, serving a synthetic corpus with injectable latency,
+# 429/5xx responses and slow bodies. Date windows and OpenAlex filters are
+# applied, so incremental harvests see only what changed. Point the
+# fetchers at it with:
+#   EUROPEPMC_SEARCH_URL=http://127.0.0.1:8765/europepmc/webservices/rest/search
+#   OPENALEX_API_URL=http://127.0.0.1:8765/works
+
+EUROPEPMC_MAX_PAGE = 1000
+OPENALEX_MAX_PAGE = 200
+# EuropePMC date windows; the free-text and AFF: parts of a query match the
+# whole corpus, which stands for the institution's output
+DATE_RANGE = re.compile(r"(FIRST_PDATE|FIRST_IDATE):\[(\d{4}-\d{2}-\d{2}) TO (\d{4}-\d{2}-\d{2})\]")
+EUROPEPMC_DATE_FIELDS = {"FIRST_PDATE": "firstPublicationDate", "FIRST_IDATE": "firstIndexDate"}
+
+# The synthetic titles never name the programme, so title.search for it
+# matches works flagged as programme works instead
+PROGRAM_TERM = "renew"
+PROGRAM_SHARE = 0.9
+HOME_INSTITUTION = "I124055696"  # University of Copenhagen
+OTHER_INSTITUTION = "I4200000001"
+HOME_SHARE = 0.85
+# OpenAlex filters the mock understands; the first two need an API key
+KEYED_FILTERS = {"from_updated_date", "from_created_date"}
+OPENALEX_FILTERS = KEYED_FILTERS | {"title.search", "authorships.institutions.lineage",
+                                    "from_publication_date", "to_publication_date"}
+
+def _later(day, rng, max_days, today):
+    return min(date.fromisoformat(day) + timedelta(days=rng.randint(0, max_days)), today).isoformat()
+
+def annotate(pubs, seed):
+    # Per-record facts the corpus does not carry but the filters need:
+    # index/creation date shortly after publication, a later update date,
+    # the affiliation and whether the work belongs to the programme
+    rng = random.Random(seed + 1)
+    today = date.today()
+    facts = []
+    for pub in pubs:
+        created = _later(pub.date, rng, 60, today)
+        facts.append({
+            "created": created,
+            "updated": _later(created, rng, 400, today),
+            "institution": HOME_INSTITUTION if rng.random() < HOME_SHARE else OTHER_INSTITUTION,
+            "program": rng.random() < PROGRAM_SHARE,
+        })
+    return facts
+
+def europepmc_record(pub, i, facts):
+    return {
+        "id": pub.pmid or f"PMC{i}",
+        "source": "MED" if pub.pmid else "PMC",
+        "pmid": pub.pmid or None,
+        "doi": pub.doi or None,
+        "title": pub.title,
+        "authorString": pub.authors,
+        "journalTitle": pub.journal,
+        "pubYear": pub.date[:4],
+        "firstPublicationDate": pub.date,
+        "firstIndexDate": facts["created"],
+    }
+
+def openalex_work(pub, i, facts):
+    institution = {"id": f"https://openalex.org/{facts['institution']}", "lineage": [f"https://openalex.org/{facts['institution']}"]}
+    return {
+        "id": f"https://openalex.org/W{4000000000 + i}",
+        "doi": f"https://doi.org/{pub.doi}" if pub.doi else None,
+        "title": pub.title,
+        "publication_date": pub.date,
+        "created_date": facts["created"],
+        "updated_date": facts["updated"],
+        "authorships": [{"author": {"display_name": name.strip()}, "institutions": [institution]}
+                        for name in pub.authors.split(",")],
+        "primary_location": {"source": {"display_name": pub.journal}},
+    }
+
+def parse_openalex_filter(text):
+    # "key:value,key:a|b" -> {key: value}; raises ValueError like the API's
+    # 400 for an unknown key
+    filters = {}
+    for part in filter(None, text.split(",")):
+        key, sep, value = part.partition(":")
+        if not sep or key not in OPENALEX_FILTERS:
+            raise ValueError(f"Invalid filter {part!r}")
+        filters[key] = value
+    return filters
+
+def openalex_matcher(filters):
+    def match(work, facts):
+        if "title.search" in filters:
+            term = filters["title.search"].lower()
+            if term not in (work["title"] or "").lower() and not (term == PROGRAM_TERM and facts["program"]):
+                return False
+        if "authorships.institutions.lineage" in filters:
+            if facts["institution"] not in filters["authorships.institutions.lineage"].split("|"):
+                return False
+        # ISO dates compare as strings; a missing bound never excludes
+        return (filters.get("from_updated_date", "") <= facts["updated"]
+                and filters.get("from_created_date", "") <= facts["created"]
+                and filters.get("from_publication_date", "") <= work["publication_date"]
+                <= filters.get("to_publication_date", "9999"))
+    return match
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor or cursor == "*":
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)[1])
+    except (ValueError, IndexError):
+        return None
+
+class MockState:
+    def __init__(self, pubs, options):
+        self.facts = annotate(pubs, options.seed)
+        self.europepmc = [europepmc_record(pub, i, facts) for i, (pub, facts) in enumerate(zip(pubs, self.facts))]
+        self.openalex = [openalex_work(pub, i, facts) for i, (pub, facts) in enumerate(zip(pubs, self.facts))]
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "429": 0, "5xx": 0}
+
+    def roll(self):
+        # Decides a request's fate up front: an injected error status, or None
+        with self.lock:
+            self.counts["requests"] += 1
+            draw = self.rng.random()
+            if draw < self.options.rate_429:
+                self.counts["429"] += 1
+                return 429
+            if draw < self.options.rate_429 + self.options.rate_5xx:
+                self.counts["5xx"] += 1
+                return self.rng.choice((500, 502, 503))
+            return None
+
+    def delay(self):
+        with self.lock:
+            jitter = self.rng.uniform(-self.options.jitter, self.options.jitter)
+        return max(0.0, self.options.latency + jitter)
+
+class Handler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if self.state.options.verbose:
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.state.delay())
+
+        status = self.state.roll()
+        if status == 429:
+            return self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": str(self.state.options.retry_after)})
+        if status:
+            return self.send_json(status, {"error": "Injected failure"})
+
+        if url.path.endswith("/search"):
+            return self.europepmc_search(params)
+        if url.path.rstrip("/").endswith("/works"):
+            return self.openalex_works(params)
+        self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def europepmc_search(self, params):
+        records = self.state.europepmc
+        for field, start, end in DATE_RANGE.findall(params.get("query", "")):
+            key = EUROPEPMC_DATE_FIELDS[field]
+            records = [r for r in records if start <= r[key] <= end]
+        size = min(int(params.get("pageSize", 25)), EUROPEPMC_MAX_PAGE)
+
+        if "cursorMark" in params:
+            cursor = params["cursorMark"]
+            offset = decode_cursor(cursor)
+            if offset is None:
+                return self.send_json(400, {"error": "Invalid cursorMark"})
+            page = records[offset:offset + size]
+            # Like the real API, the last page hands back the cursor it was given
+            next_cursor = encode_cursor(offset + size) if offset + size < len(records) else cursor
+        else:
+            offset = (int(params.get("page", 1)) - 1) * size
+            page = records[offset:offset + size]
+            next_cursor = None
+
+        body = {"version": "6.9", "hitCount": len(records)}
+        if next_cursor is not None:
+            body["nextCursorMark"] = next_cursor
+        body["request"] = {"queryString": params.get("query", ""), "pageSize": size}
+        body["resultList"] = {"result": page}
+        self.send_json(200, body)
+
+    def openalex_works(self, params):
+        try:
+            filters = parse_openalex_filter(params.get("filter", ""))
+        except ValueError as e:
+            return self.send_json(400, {"error": "Invalid query parameters error.", "message": str(e)})
+        keyed = KEYED_FILTERS.intersection(filters)
+        if keyed and not params.get("api_key"):
+            return self.send_json(403, {"error": f"{', '.join(sorted(keyed))} requires an API key"})
+        match = openalex_matcher(filters)
+        works = [work for work, facts in zip(self.state.openalex, self.state.facts) if match(work, facts)]
+        size = min(int(params.get("per-page", 25)), OPENALEX_MAX_PAGE)
+        if "cursor" in params:
+            offset = decode_cursor(params["cursor"])
+            if offset is None:
+                return self.send_json(400, {"error": "Invalid cursor"})
+            next_cursor = encode_cursor(offset + size) if offset + size < len(works) else None
+            page_number = None
+        else:
+            page_number = int(params.get("page", 1))
+            offset = (page_number - 1) * size
+            next_cursor = None
+        meta = {"count": len(works), "db_response_time_ms": 1, "page": page_number,
+                "per_page": size, "next_cursor": next_cursor}
+        self.send_json(200, {"meta": meta, "results": works[offset:offset + size], "group_by": []})
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        rate = self.state.options.slow_body_kbps * 1024
+        if not rate:
+            self.wfile.write(data)
+            return
+        # Slow body: trickle the payload out in 4 KiB chunks
+        chunk = 4096
+        for start in range(0, len(data), chunk):
+            self.wfile.write(data[start:start + chunk])
+            self.wfile.flush()
+            time.sleep(chunk / rate)
+
+def serve(options):
+    pubs = corpus.generate(corpus.SIZES.get(options.size) or int(options.size), seed=options.seed)
+    Handler.state = MockState(pubs, options)
+    server = ThreadingHTTPServer((options.host, options.port), Handler)
+    server.daemon_threads = True
+    print(f"🧪 Serving {len(pubs)} synthetic publications on http://{options.host}:{options.port} "
+          f"(latency {options.latency}±{options.jitter}s, 429 {options.rate_429:.0%}, "
+          f"5xx {options.rate_5xx:.0%}, body {options.slow_body_kbps or '∞'} KiB/s)")
+    return server
+
+def scratch_harvest(base_url):
+    # Runs both fetchers against the stand-in with everything they write
+    # (store, watermarks, staging, HTTP cache) in a throwaway directory, so
+    # the synthetic corpus never reaches the real output/
+    from etl import europepmc, harvest_state, http_cache, import_openalex, ndjson, store
+
+    with tempfile.TemporaryDirectory(prefix="renew-mock-") as workdir:
+        store.DB_PATH = os.path.join(workdir, "publications.sqlite")
+        store.EXPORT_PATH = os.path.join(workdir, "publications.json")
+        store.DATASET_PATH = os.path.join(workdir, "publications.dataset")
+        harvest_state.STATE_FILE = os.path.join(workdir, "harvest_state.json")
+        ndjson.STAGING_DIR = os.path.join(workdir, "staging")
+        http_cache.CACHE_DIR = os.path.join(workdir, ".http_cache")
+        europepmc.SEARCH_URL = f"{base_url}/europepmc/webservices/rest/search"
+        import_openalex.OPENALEX_API = f"{base_url}/works"
+        for name, fetch in (("europepmc", europepmc.fetch_publications), ("openalex", import_openalex.harvest)):
+            started = time.perf_counter()
+            fetch(full=True)
+            print(f"⏱️ {name} harvest: {time.perf_counter() - started:.1f}s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local EuropePMC/OpenAlex stand-in with fault injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", default="10k", help=f"{', '.join(corpus.SIZES)} or a record count")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± seconds of uniform latency jitter")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="share of requests answered 500/502/503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--slow-body-kbps", type=float, default=0.0, help="throttle response bodies (0 = off)")
+    parser.add_argument("--seed", type=int, default=20250501)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--harvest", action="store_true",
+                        help="run both fetchers against the server in a scratch directory, then exit")
+    return parser.parse_args(argv)
+
+def main():
+    options = parse_args()
+    server = serve(options)
+    try:
+        if options.harvest:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            scratch_harvest(f"http://{options.host}:{options.port}")
+            server.shutdown()
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        counts = Handler.state.counts
+        print(f"\n🧪 {counts['requests']} requests, injected {counts['429']}×429 and {counts['5xx']}×5xx")
+
+if __name__ == "__main__":
+    main()
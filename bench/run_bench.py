@@ -0,0 +1,197 @@
+# bench/run_bench.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import corpus
+from etl import dedup, export_csv, generate_html, import_csv, import_openalex, store
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+TOLERANCE = 0.25  # slower or bigger than baseline by more than this is a regression
+
+# Each benchmark is (setup, run): setup builds the inputs in a scratch
+# directory and is not timed; run is the measured stage call
+
+def _fill_store(pubs):
+    # Bulk insert that skips matching, so setup stays cheap at 1M records
+    now = time.time()
+    rows = []
+    for pub in pubs:
+        item = dedup.prepare(pub)
+        values = [value or None for value in pub.to_row()]
+        rows.append(values + [item.doi or None, item.title or None, now])
+    conn = store.connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO publications (title, authors, journal, date, doi, pmid, source, doi_key, title_key, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+    conn.close()
+
+def setup_dedup(pubs, workdir):
+    return pubs
+
+def run_dedup(pubs):
+    import_csv.deduplicate(pubs)
+
+def setup_merge(pubs, workdir):
+    _fill_store(pub for pub in pubs if pub.source != "OpenAlex")
+    return [pub for pub in pubs if pub.source == "OpenAlex"]
+
+def run_merge(openalex_pubs):
+    import_openalex.merge_and_tag(openalex_pubs)
+
+def setup_export(pubs, workdir):
+    _fill_store(pubs)
+    return os.path.join(workdir, "publications.csv")
+
+def run_export(csv_path):
+    export_csv.export_csv(csv_path)
+
+def setup_render(pubs, workdir):
+    _fill_store(pubs)
+    store.export_dataset()
+    os.makedirs(os.path.join(workdir, "output"), exist_ok=True)
+    return workdir
+
+def run_render(workdir):
+    # generate_html writes to output/ relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        generate_html.generate_html()
+    finally:
+        os.chdir(cwd)
+
+def setup_workbook(pubs, workdir):
+    path = os.path.join(workdir, "reNEW_PUB.xlsx")
+    corpus.write_workbook(path, pubs)
+    import_csv.EXCEL_FILE = path
+    return path
+
+def run_workbook_pandas(path):
+    import_csv.read_with_pandas()
+
+def run_workbook_stream(path):
+    import_csv.read_streaming()
+
+BENCHMARKS = {
+    "dedup": (setup_dedup, run_dedup),
+    "merge_and_tag": (setup_merge, run_merge),
+    "export_csv": (setup_export, run_export),
+    "generate_html": (setup_render, run_render),
+    "workbook_pandas": (setup_workbook, run_workbook_pandas),
+    "workbook_stream": (setup_workbook, run_workbook_stream),
+}
+
+@contextlib.contextmanager
+def scratch():
+    # Points every output the stages write at a throwaway directory
+    saved = (store.DB_PATH, store.EXPORT_PATH, store.DATASET_PATH, import_csv.EXCEL_FILE)
+    with tempfile.TemporaryDirectory(prefix="renew-bench-") as workdir:
+        store.DB_PATH = os.path.join(workdir, "publications.sqlite")
+        store.EXPORT_PATH = os.path.join(workdir, "publications.json")
+        store.DATASET_PATH = os.path.join(workdir, "publications.dataset")
+        try:
+            yield workdir
+        finally:
+            store.DB_PATH, store.EXPORT_PATH, store.DATASET_PATH, import_csv.EXCEL_FILE = saved
+
+def measure(name, pubs, repeat, memory=True):
+    setup, run = BENCHMARKS[name]
+    timings = []
+    peak = None
+    for attempt in range(repeat + (1 if memory else 0)):
+        with scratch() as workdir, contextlib.redirect_stdout(io.StringIO()):
+            arg = setup(pubs, workdir)
+            if attempt < repeat:
+                started = time.perf_counter()
+                run(arg)
+                timings.append(time.perf_counter() - started)
+            else:
+                # A separate pass: tracemalloc slows allocation-heavy code
+                tracemalloc.start()
+                run(arg)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    result = {"seconds": round(min(timings), 4), "median_seconds": round(statistics.median(timings), 4),
+              "runs": [round(t, 4) for t in timings]}
+    if peak is not None:
+        result["peak_mb"] = round(peak / 1024 / 1024, 2)
+    return result
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if metric in result and base.get(metric):
+                ratio = result[metric] / base[metric]
+                flag = "❌" if ratio > 1 + tolerance else "✅"
+                print(f"  {flag} {key:<28} {metric:<8} {base[metric]:>10} → {result[metric]:>10} ({ratio:.2f}×)")
+                if ratio > 1 + tolerance:
+                    regressions.append((key, metric, ratio))
+    return regressions
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages on synthetic corpora")
+    parser.add_argument("--sizes", default="1k,10k", help=f"comma-separated, from {', '.join(corpus.SIZES)}")
+    parser.add_argument("--stages", default=",".join(BENCHMARKS), help="comma-separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (the fastest counts)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store results as {os.path.relpath(BASELINE_PATH)}")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = {}
+    for size_name in args.sizes.split(","):
+        pubs = corpus.generate(corpus.SIZES[size_name])
+        for name in args.stages.split(","):
+            key = f"{name}@{size_name}"
+            results[key] = measure(name, pubs, args.repeat, memory=not args.no_memory)
+            peak = f", peak {results[key]['peak_mb']} MB" if "peak_mb" in results[key] else ""
+            print(f"⏱️ {key:<28} {results[key]['seconds']:.3f}s{peak}")
+
+    report = {"python": platform.python_version(), "machine": platform.machine(),
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    _write_json(RESULTS_PATH, report)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, encoding="utf-8") as f:
+                baseline = json.load(f).get("results", {})
+        baseline.update(results)
+        _write_json(BASELINE_PATH, dict(report, results=baseline))
+        print(f"💾 Baseline saved → {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print("\n📊 Against baseline:")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
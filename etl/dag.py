@@ -0,0 +1,213 @@
+# etl/dag.py
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from etl import metrics
+except ImportError:  # run as a script from etl/
+    import metrics
+
+ETL_DIR = os.path.dirname(os.path.abspath(__file__))
+MEMO_FILE = os.path.join(os.path.dirname(ETL_DIR), "output", "stage_memo.json")
+
+class Stage:
+    # inputs: optional callable returning a JSON-able description of
+    # everything the stage reads (file digests, code digest, config). When it
+    # matches the last successful run, and check() (if given) confirms the
+    # outputs are still there, the stage is skipped as "cached".
+    def __init__(self, name, func, deps=(), inputs=None, check=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.check = check
+
+def file_digest(path, missing="missing"):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except FileNotFoundError:
+        return missing
+
+def dir_digest(root):
+    # Hash of every file under root, by relative path and content, so adding,
+    # renaming or editing any of them changes it
+    digest = hashlib.sha256()
+    for folder, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            digest.update(os.path.relpath(path, root).encode() + b"\0" + file_digest(path).encode())
+    return digest.hexdigest()
+
+def env_inputs(*names):
+    # Environment settings a stage reads, for its inputs; the memo only keeps
+    # a hash of those, so credentials among them are not written out
+    return {name: os.environ.get(name) for name in names}
+
+def _etl_imports(path):
+    # etl modules a file imports, as written: "from etl import a, b",
+    # "from etl.a import x", or plain "import a" when run from etl/
+    tree = ast.parse(open(path, encoding="utf-8").read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == "etl":
+                names.update(alias.name for alias in node.names)
+            elif node.module.startswith("etl."):
+                names.add(node.module.split(".", 1)[1])
+            else:
+                names.add(node.module)
+        elif isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+    return {name for name in names if os.path.exists(os.path.join(ETL_DIR, f"{name}.py"))}
+
+def code_digest(*paths):
+    # Hash of the given source files and every etl module they import,
+    # transitively, so editing any code a stage runs invalidates it
+    seen = set()
+    todo = [os.path.abspath(str(path)) for path in paths]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        todo.extend(os.path.join(ETL_DIR, f"{name}.py") for name in _etl_imports(path))
+    digest = hashlib.sha256()
+    for path in sorted(seen):
+        digest.update(os.path.relpath(path, ETL_DIR).encode() + b"\0" + file_digest(path).encode())
+    return digest.hexdigest()
+
+def load_memo(path=None):
+    try:
+        with open(path or MEMO_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_memo(memo, path=None):
+    path = path or MEMO_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(memo, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def check_graph(stages):
+    # Every dependency must be declared and the graph must have no cycles
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name!r} depends on unknown stage {dep!r}")
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through stage {name!r}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return by_name
+
+def run(stages, max_workers=4, memo_path=None, force=False):
+    # Starts each stage as soon as all its dependencies have finished.
+    # Returns {name: {"start", "end", "status"}} with times in seconds from
+    # the pipeline start; a failed stage skips everything downstream of it.
+    # force=True runs every stage but still records its inputs.
+    by_name = check_graph(stages)
+    timeline = {}
+    pending = list(by_name)
+    running = {}
+    failed = None
+    memo = load_memo(memo_path)
+    memo_lock = threading.Lock()
+    t0 = time.monotonic()
+
+    def timed(stage):
+        timeline[stage.name] = {"start": time.monotonic() - t0, "end": None, "status": "running"}
+        with metrics.track(stage.name):
+            return _run_stage(stage)
+
+    def _run_stage(stage):
+        try:
+            key = None
+            if stage.inputs is not None:
+                # Inputs are read after the dependencies finished, so a stage
+                # sees what its upstream stages actually produced
+                key = hashlib.sha256(json.dumps(stage.inputs(), sort_keys=True).encode()).hexdigest()
+                if not force and memo.get(stage.name) == key and (stage.check is None or stage.check()):
+                    print(f"⏭️ {stage.name}: inputs unchanged, skipping")
+                    return "cached"
+            stage.func()
+            if key is not None:
+                with memo_lock:
+                    memo[stage.name] = key
+                    save_memo(memo, memo_path)
+            return "ok"
+        finally:
+            timeline[stage.name]["end"] = time.monotonic() - t0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            if failed is None:
+                for name in list(pending):
+                    if all(timeline.get(dep, {}).get("status") in ("ok", "cached") for dep in by_name[name].deps):
+                        pending.remove(name)
+                        running[pool.submit(timed, by_name[name])] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                error = future.exception()
+                timeline[name]["status"] = future.result() if error is None else "failed"
+                metrics.set_status(name, timeline[name]["status"])
+                if error is not None and failed is None:
+                    failed = (name, error)
+
+    for name in pending:
+        timeline[name] = {"start": None, "end": None, "status": "skipped"}
+    if failed:
+        print_timeline(stages, timeline)
+        name, error = failed
+        raise RuntimeError(f"Stage {name!r} failed: {error}") from error
+    return timeline
+
+def critical_path(stages, timeline):
+    # Walk back from the last stage to finish through whichever dependency
+    # finished last: the chain that set the total run time
+    by_name = {stage.name: stage for stage in stages}
+    done = [name for name, t in timeline.items() if t["end"] is not None]
+    if not done:
+        return []
+    path = [max(done, key=lambda name: timeline[name]["end"])]
+    while by_name[path[-1]].deps:
+        path.append(max(by_name[path[-1]].deps, key=lambda dep: timeline[dep]["end"] or 0))
+    return path[::-1]
+
+def print_timeline(stages, timeline, width=40):
+    total = max((t["end"] or 0 for t in timeline.values()), default=0) or 1
+    path = set(critical_path(stages, timeline))
+    print("\n⏱️ Stage timeline:")
+    for stage in stages:
+        t = timeline.get(stage.name, {"start": None, "end": None, "status": "skipped"})
+        if t["start"] is None:
+            print(f"  {stage.name:<12} {'':<{width}}  {t['status']}")
+            continue
+        end = t["end"] if t["end"] is not None else total
+        lead = int(t["start"] / total * width)
+        bar = "█" * max(1, int((end - t["start"]) / total * width))
+        mark = " ◀ critical path" if stage.name in path else ""
+        print(f"  {stage.name:<12} {' ' * lead + bar:<{width}}  "
+              f"{t['start']:6.1f}s → {end:6.1f}s ({end - t['start']:.1f}s, {t['status']}){mark}")
@@ -0,0 +1,213 @@
+# etl/dedup.py
+import gc
+import html
+import re
+from contextlib import contextmanager
+import unicodedata
+from itertools import chain
+from urllib.parse import unquote
+
+import numpy as np
+
+# MinHash/LSH settings: 16 bands of 4 rows put the LSH threshold near a
+# Jaccard of 0.5, and candidates are then checked exactly against
+# TITLE_THRESHOLD, so blocking stays loose and the final verdict strict
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+TITLE_THRESHOLD = 0.8
+MAX_BUCKET = 64  # an overfull bucket only holds boilerplate, stop growing it
+MIN_FUZZY_LENGTH = 25  # short titles ("Correction", "Editorial") match exactly or not at all
+SIGNATURE_BATCH = 300  # records per vectorized MinHash batch
+
+# Permutations are (a * x + b) mod 2**32 with odd a, a bijection on 32-bit
+# hashes; uint32 arithmetic wraps on its own, so no modulo pass is needed
+_rng = np.random.RandomState(20250501)
+_A = _rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+_B = _rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64).astype(np.uint32)
+_BAND_MIX = _rng.randint(1, 2 ** 32, size=ROWS, dtype=np.uint64)
+
+DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+TAG = re.compile(r"<[^>]+>")
+NON_WORD = re.compile(r"[\W_]+")
+
+def normalize_doi(doi):
+    doi = unquote(DOI_PREFIX.sub("", str(doi or "").strip())).strip().rstrip(".,;")
+    return doi.lower() if doi.startswith("10.") else ""
+
+def normalize_title(title):
+    # EuropePMC titles carry <i>/<sub> markup and entities; CURIS titles don't
+    text = str(title or "")
+    if "&" in text:
+        text = html.unescape(text)
+    if "<" in text:
+        text = TAG.sub(" ", text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(NON_WORD.sub(" ", text.casefold()).split())
+
+def publication_year(date):
+    # "2024" from "2024-03-15" or "2024"; "" when there is no usable year
+    year = str(date or "").strip()[:4]
+    return year if year.isdigit() else ""
+
+def shingles(norm_title):
+    text = norm_title.replace(" ", "")
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+def minhash_bands(shingle_sets):
+    # MinHash signatures for many shingle sets in one vectorized pass, each
+    # folded into BANDS ints (a rare fold collision only adds a candidate,
+    # which the exact Jaccard check then rejects). hash() is salted per
+    # process, which is fine: signatures never leave it.
+    # Sets are padded to a common width by repeating their first shingle,
+    # which leaves each minimum unchanged.
+    width = max(len(grams) for grams in shingle_sets)
+    padded = np.fromiter(
+        chain.from_iterable(
+            chain(map(hash, grams), [hash(next(iter(grams)))] * (width - len(grams)))
+            for grams in shingle_sets
+        ),
+        dtype=np.int64, count=len(shingle_sets) * width,
+    ).reshape(len(shingle_sets), width, 1)
+    values = padded.astype(np.uint32) * _A
+    values += _B
+    signatures = values.min(axis=1).astype(np.uint64)
+    return (signatures.reshape(len(shingle_sets), BANDS, ROWS) * _BAND_MIX).sum(axis=2).tolist()
+
+class Prepared:
+    # A record's match keys, computed once and shared by match() and add()
+    __slots__ = ("doi", "pmid", "title", "year", "grams", "_bands")
+
+    def __init__(self, record):
+        self.doi = normalize_doi(record.doi)
+        self.pmid = record.pmid
+        self.title = normalize_title(record.title)
+        self.year = publication_year(record.date)
+        self.grams = shingles(self.title) if len(self.title) >= MIN_FUZZY_LENGTH else None
+        self._bands = None
+
+    @property
+    def bands(self):
+        if self._bands is None:
+            self._bands = minhash_bands([self.grams])[0]
+        return self._bands
+
+def prepare(record):
+    return record if isinstance(record, Prepared) else Prepared(record)
+
+def prepare_all(records):
+    items = [prepare(record) for record in records]
+    pending = [item for item in items if item.grams is not None and item._bands is None]
+    for start in range(0, len(pending), SIGNATURE_BATCH):
+        batch = pending[start:start + SIGNATURE_BATCH]
+        for item, bands in zip(batch, minhash_bands([item.grams for item in batch])):
+            item._bands = bands
+    return items
+
+@contextmanager
+def bulk_build():
+    # Building an index allocates millions of small sets and lists that are
+    # never cyclic garbage; pausing the cyclic collector keeps it from
+    # rescanning them over and over as they pile up
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class DedupIndex:
+    # Maps records to cluster keys: exact DOI/PMID/title lookups first, then
+    # LSH buckets over title MinHashes, so each lookup touches only a handful
+    # of candidates instead of every record seen so far. Exact titles are
+    # keyed with the year: "Editorial" or "Correction" alone names many works.
+    def __init__(self, threshold=TITLE_THRESHOLD):
+        self.threshold = threshold
+        self.by_doi = {}
+        self.by_pmid = {}
+        self.by_title = {}
+        self.buckets = [{} for _ in range(BANDS)]
+        self.shingles = {}
+        self.dois = {}
+        self.years = {}
+
+    def _compatible(self, key, item):
+        # Two different DOIs or years are two different works, however
+        # similar the title
+        doi, year = self.dois.get(key), self.years.get(key)
+        return not (item.doi and doi and item.doi != doi) and not (item.year and year and item.year != year)
+
+    def match(self, record):
+        item = prepare(record)
+        if item.doi and item.doi in self.by_doi:
+            return self.by_doi[item.doi]
+        if item.pmid and item.pmid in self.by_pmid:
+            return self.by_pmid[item.pmid]
+        key = self.by_title.get((item.title, item.year))
+        if key is not None and self._compatible(key, item):
+            return key
+        if item.grams is None:
+            return None
+
+        candidates = set()
+        for band, bucket in zip(item.bands, self.buckets):
+            candidates.update(bucket.get(band, ()))
+        best, best_score = None, self.threshold
+        for key in candidates:
+            score = jaccard(item.grams, self.shingles[key])
+            if score >= best_score and self._compatible(key, item):
+                best, best_score = key, score
+        return best
+
+    def add(self, key, record):
+        item = prepare(record)
+        if item.doi:
+            self.by_doi.setdefault(item.doi, key)
+            self.dois.setdefault(key, item.doi)
+        if item.pmid:
+            self.by_pmid.setdefault(item.pmid, key)
+        if item.year:
+            self.years.setdefault(key, item.year)
+        if item.title:
+            self.by_title.setdefault((item.title, item.year), key)
+        if item.grams is not None and key not in self.shingles:
+            self.shingles[key] = item.grams
+            for band, bucket in zip(item.bands, self.buckets):
+                keys = bucket.setdefault(band, [])
+                if len(keys) < MAX_BUCKET:
+                    keys.append(key)
+
+def cluster(records, threshold=TITLE_THRESHOLD):
+    # Returns one cluster per distinct work, in first-seen order. Each cluster
+    # has the merged Publication (earlier records win, later ones fill gaps),
+    # its member records and the sources they came from.
+    with bulk_build():
+        return _cluster(records, threshold)
+
+def _cluster(records, threshold):
+    index = DedupIndex(threshold)
+    clusters = []
+    for record, item in zip(records, prepare_all(records)):
+        key = index.match(item)
+        if key is None:
+            key = len(clusters)
+            clusters.append({"record": record.copy(), "members": [], "sources": []})
+        found = clusters[key]
+        found["members"].append(record)
+        if record.source and record.source not in found["sources"]:
+            found["sources"].append(record.source)
+        found["record"].fill_from(record)
+        # Index every member so later records can match any of its keys
+        index.add(key, item)
+    return clusters
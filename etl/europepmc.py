@@ -1,50 +1,144 @@
 # etl/europepmc.py
-import requests
-import json
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+try:
+    from etl import harvest_state, http_cache, http_client, json_stream, metrics, ndjson, store
+    from etl.record import Publication
+except ImportError:  # run as a script: python etl/europepmc.py
+    import harvest_state
+    import http_cache
+    import http_client
+    import json_stream
+    import metrics
+    import ndjson
+    import store
+    from record import Publication
 
 FROM_DATE = "2022-05-01"
 TO_DATE = "2025-05-01"
 
-# Output file path (absolute)
-OUTPUT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "output", "publications.json")
+# Overridable to point the fetcher at a stand-in (bench/mock_server.py)
+SEARCH_URL = os.environ.get("EUROPEPMC_SEARCH_URL", "https://www.ebi.ac.uk/europepmc/webservices/rest/search")
+PAGE_SIZE = 1000
+SHARD_MONTHS = 6      # width of each FIRST_PDATE window fetched in parallel
+MAX_WORKERS = 4       # shards in flight at once
+
+BASE_QUERY = (
+    '"Novo Nordisk Foundation Center for Stem Cell Medicine" AND '
+    '(AFF:CPH OR AFF:UCPH OR AFF:"University of Copenhagen" OR AFF:DanStem)'
+)
 
-def fetch_publications():
-    query = (
-        '"Novo Nordisk Foundation Center for Stem Cell Medicine" AND '
-        '(AFF:CPH OR AFF:UCPH OR AFF:"University of Copenhagen" OR AFF:DanStem) AND '
-        f'FIRST_PDATE:[{FROM_DATE} TO {TO_DATE}]'
+def date_shards(from_date, to_date, months=SHARD_MONTHS):
+    # Split [from_date, to_date] into non-overlapping inclusive windows
+    start = date.fromisoformat(from_date)
+    end = date.fromisoformat(to_date)
+    shards = []
+    while start <= end:
+        month = start.month - 1 + months
+        next_start = date(start.year + month // 12, month % 12 + 1, 1)
+        shard_end = min(next_start - timedelta(days=1), end)
+        shards.append((start.isoformat(), shard_end.isoformat()))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+def normalize_record(record):
+    return Publication(
+        title=record.get("title"),
+        authors=record.get("authorString"),
+        journal=record.get("journalTitle"),
+        date=record.get("firstPublicationDate") or record.get("pubYear"),
+        doi=record.get("doi"),
+        pmid=record.get("pmid"),
+        source="EuropePMC"
     )
-    url = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
-    params = {
-        "query": query,
-        "format": "json",
-        "pageSize": 1000
-    }
-
-    results = []
-    print("🔎 Searching EuropePMC...")
-    response = requests.get(url, params=params)
-    data = response.json()
-
-    for record in data.get("resultList", {}).get("result", []):
-        results.append({
-            "title": record.get("title"),
-            "authors": record.get("authorString"),
-            "journal": record.get("journalTitle"),
-            "year": record.get("pubYear"),
-            "date": record.get("firstPublicationDate") or record.get("pubYear"),
-            "doi": record.get("doi"),
-            "source": "EuropePMC"
-        })
-
-    print(f"✅ Found {len(results)} publications")
-
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+
+def iter_page_records(response):
+    with response.open_body() as body:
+        for record in json_stream.iter_items(body, "resultList.result.item"):
+            yield normalize_record(record)
+
+def fetch_shard(shard, writer, indexed_since=None):
+    # Each page is appended to the staging file as soon as it is parsed
+    from_date, to_date = shard
+    query = f"{BASE_QUERY} AND FIRST_PDATE:[{from_date} TO {to_date}]"
+    if indexed_since:
+        query += f" AND FIRST_IDATE:[{indexed_since} TO {harvest_state.today()}]"
+    cursor = "*"
+    total = 0
+
+    while True:
+        params = {
+            "query": query,
+            "format": "json",
+            "resultType": "lite",
+            "pageSize": PAGE_SIZE,
+            "cursorMark": cursor
+        }
+        # Streamed into the cache and parsed from there one record at a time
+        response = http_client.get(SEARCH_URL, params=params, stream=True)
+        response.raise_for_status()
+
+        page_count = writer.write_many(iter_page_records(response))
+        total += page_count
+
+        with response.open_body() as body:
+            next_cursor = json_stream.first_value(body, "nextCursorMark")
+        if not page_count or not next_cursor or next_cursor == cursor:
+            break
+        cursor = next_cursor
+
+    print(f"→ {from_date} … {to_date}: {total} records")
+    return total
+
+def merge_records(records):
+    # Shards can overlap on revised publication dates: drop repeats by PMID or DOI
+    seen_pmids = set()
+    seen_dois = set()
+    for pub in records:
+        pmid = pub.pmid
+        doi = pub.doi.lower()
+        if (pmid and pmid in seen_pmids) or (doi and doi in seen_dois):
+            continue
+        yield pub
+        if pmid:
+            seen_pmids.add(pmid)
+        if doi:
+            seen_dois.add(doi)
+
+def fetch_publications(full=False):
+    started = harvest_state.today()
+    # An empty store needs the full history whatever the watermark says. So
+    # does a replay: an incremental query embeds the watermark and today's
+    # date, so it is never the query the cache recorded.
+    full = full or http_cache.replay_enabled()
+    watermark = None if full or not store.has_source("EuropePMC") else harvest_state.get_watermark("europepmc")
+
+    staging = ndjson.staging_path("europepmc")
+    with ndjson.Writer(staging) as writer:
+        if watermark:
+            # Only records indexed since the last run; one window covers them
+            print(f"🔎 Searching EuropePMC for records indexed since {watermark}...")
+            fetch_shard((FROM_DATE, TO_DATE), writer, indexed_since=watermark)
+        else:
+            shards = date_shards(FROM_DATE, TO_DATE)
+            print(f"🔎 Searching EuropePMC ({len(shards)} date shards, {MAX_WORKERS} workers)...")
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+                list(pool.map(metrics.stage_thread(lambda shard: fetch_shard(shard, writer)), shards))
+    http_client.print_summary()
+    metrics.add("records_in", writer.count)
+
+    # Streamed back from the staging file straight into the store
+    inserted, updated = store.upsert(merge_records(ndjson.iter_records(staging)), "EuropePMC")
+    print(f"✅ Found {inserted + updated} publications ({writer.count} fetched)")
+
+    # A replayed run saw nothing new, so it must not move the watermark
+    if not http_cache.replay_enabled():
+        harvest_state.set_watermark("europepmc", started)
 
 if __name__ == "__main__":
-    fetch_publications()
+    if "--replay" in sys.argv:
+        http_cache.set_replay()
+    fetch_publications(full="--full" in sys.argv)
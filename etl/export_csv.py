@@ -1,28 +1,54 @@
-import json
 import csv
 import os
 
-def export_csv():
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    json_path = os.path.join(base_dir, "output", "publications.json")
-    csv_path = os.path.join(base_dir, "output", "publications.csv")
-
-    with open(json_path, encoding="utf-8") as f:
-        records = json.load(f)
-
-    with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Authors", "Title", "Journal", "Pub Date", "DOI", "Source"])
-
-        for pub in records:
-            writer.writerow([
-                pub.get("authors", ""),
-                pub.get("title", ""),
-                pub.get("journal", ""),
-                pub.get("date", ""),
-                pub.get("doi", ""),
-                pub.get("source", "EuropePMC")
-            ])
+try:
+    from etl import metrics, store
+except ImportError:  # run as a script: python etl/export_csv.py
+    import metrics
+    import store
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "publications.csv")
+
+def export_csv(csv_path=None):
+    csv_path = csv_path or CSV_PATH
+
+    # One read transaction keeps both passes over the store on the same
+    # snapshot, even if a harvest writes to it meanwhile
+    conn = store.connect()
+    try:
+        conn.execute("BEGIN")
+
+        # Rows are written to the CSV and to publications.json as they stream
+        # out of the store, each into a temporary file so a crash never leaves
+        # a half-written export behind
+        tmp_path = csv_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Authors", "Title", "Journal", "Pub Date", "DOI", "Source"])
+
+            def rows():
+                for pub in store.iter_publications(conn):
+                    writer.writerow([
+                        pub.authors,
+                        pub.title,
+                        pub.journal,
+                        pub.date,
+                        pub.doi,
+                        pub.source or "EuropePMC"
+                    ])
+                    yield pub
+
+            # publications.json is the human-readable export of the store
+            count = store.export_json(rows())
+        os.replace(tmp_path, csv_path)
+        metrics.add("records_in", count)
+        metrics.add("records_out", count)
+
+        # The compact dataset generate_html reads is column-wise, so it is
+        # encoded whole; a second pass feeds it rows straight from the store
+        store.export_dataset(store.iter_publications(conn))
+    finally:
+        conn.close()
 
     print(f"✅ CSV exported to: {csv_path}")
 
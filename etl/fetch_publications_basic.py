@@ -1,11 +1,21 @@
 # fetch_publications_basic.py
-import requests
-import json
+import math
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from etl import http_cache, http_client, ndjson, store
+    from etl.record import Publication
+except ImportError:  # run as a script: python etl/fetch_publications_basic.py
+    import http_cache
+    import http_client
+    import ndjson
+    import store
+    from record import Publication
 
 FROM_DATE = "2021-05-01"
 TO_DATE = "2025-05-01"
-OUTPUT_FILE = "../output/publications.json"
 
 QUERY_VARIANTS = [
     # 1. Exact institutional name with no affiliation filtering
@@ -18,67 +28,133 @@ QUERY_VARIANTS = [
     '"Stem Cell Medicine" AND AFF:"University of Copenhagen" AND FIRST_PDATE:[{FROM_DATE} TO {TO_DATE}]',
 ]
 
-def fetch_publications():
-    url = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
-    page_size = 1000
-    records = {}
-
-    for variant in QUERY_VARIANTS:
-        query = variant.format(FROM_DATE=FROM_DATE, TO_DATE=TO_DATE)
-        print(f"\n🔎 Trying query: {query}")
-        page = 1
-        total_new = 0
-
-        while True:
-            params = {
-                "query": query,
-                "format": "json",
-                "pageSize": page_size,
-                "page": page,
-                "sort": "FIRST_PDATE desc"
-            }
-            try:
-                r = requests.get(url, params=params, timeout=20)
-                r.raise_for_status()
-                results = r.json().get("resultList", {}).get("result", [])
-            except Exception as e:
-                print(f"❌ Page {page} failed: {e}")
-                break
-
-            if not results:
-                print(f"✅ No more records for this query on page {page}")
-                break
-
-            new = 0
-            for record in results:
-                pmid = record.get("id")
-                if pmid and pmid not in records:
-                    records[pmid] = {
-                        "pmid": pmid,
-                        "title": record.get("title"),
-                        "authors": record.get("authorString"),
-                        "journal": record.get("journalTitle"),
-                        "year": record.get("pubYear"),
-                        "date": record.get("firstPublicationDate") or record.get("pubYear"),
-                        "doi": record.get("doi"),
-                        "has_data_links": record.get("hasDataLinks") == "Y"
-                    }
-                    new += 1
-
-            print(f"→ Page {page}: {len(results)} results, {new} new")
-            total_new += new
-            page += 1
-
-        print(f"✅ Query completed with {total_new} new records.\n")
-
-        if total_new > 0:
-            break  # Stop at first query that returns results
-
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(list(records.values()), f, indent=2, ensure_ascii=False)
-
-    print(f"💾 Final saved count: {len(records)} unique records → {OUTPUT_FILE}")
+# Overridable to point the fetcher at a stand-in (bench/mock_server.py)
+SEARCH_URL = os.environ.get("EUROPEPMC_SEARCH_URL", "https://www.ebi.ac.uk/europepmc/webservices/rest/search")
+PAGE_SIZE = 1000
+PAGE_WORKERS = 4  # pages fetched in parallel per query variant
+
+def normalize_record(record):
+    return Publication(
+        pmid=record.get("id"),
+        title=record.get("title"),
+        authors=record.get("authorString"),
+        journal=record.get("journalTitle"),
+        date=record.get("firstPublicationDate") or record.get("pubYear"),
+        doi=record.get("doi"),
+        source="EuropePMC"
+    )
+
+def fetch_page(query, page):
+    params = {
+        "query": query,
+        "format": "json",
+        "pageSize": PAGE_SIZE,
+        "page": page,
+        "sort": "FIRST_PDATE desc"
+    }
+    r = http_client.get(SEARCH_URL, params=params)
+    r.raise_for_status()
+    data = r.json()
+    return data.get("resultList", {}).get("result", []), int(data.get("hitCount", 0))
+
+def fetch_variant(query, writer):
+    # Page 1 tells us hitCount, so the remaining pages can all go out at once.
+    # Each page is appended to the variant's staging file as it arrives;
+    # returns the number of hits fetched.
+    try:
+        results, hit_count = fetch_page(query, 1)
+    except Exception as e:
+        print(f"❌ Page 1 failed for {query}: {e}")
+        return 0
+    writer.write_many(map(normalize_record, results))
+
+    def fetch_rest(page):
+        try:
+            results = fetch_page(query, page)[0]
+        except Exception as e:
+            print(f"❌ Page {page} failed for {query}: {e}")
+            return 0
+        writer.write_many(map(normalize_record, results))
+        return len(results)
+
+    pages = range(2, math.ceil(hit_count / PAGE_SIZE) + 1)
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+        return len(results) + sum(pool.map(fetch_rest, pages))
+
+def fetch_all_variants(seen):
+    queries = [v.format(FROM_DATE=FROM_DATE, TO_DATE=TO_DATE) for v in QUERY_VARIANTS]
+    paths = [ndjson.staging_path(f"europepmc_basic_{i}") for i in range(1, len(queries) + 1)]
+    print(f"🔎 Running {len(queries)} query variants concurrently...")
+
+    def run(query, path):
+        with ndjson.Writer(path) as writer:
+            return fetch_variant(query, writer)
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        hits = list(pool.map(run, queries, paths))
+    http_client.print_summary()
+
+    # Union in QUERY_VARIANTS order so the "added" counts are reproducible;
+    # records stream from the staging files, only the PMIDs stay in memory
+    print("\n📊 Per-variant report:")
+    for i, (query, path, count) in enumerate(zip(queries, paths, hits), start=1):
+        new = 0
+        for pub in ndjson.iter_records(path):
+            if pub.pmid and pub.pmid not in seen:
+                seen.add(pub.pmid)
+                new += 1
+                yield pub
+        print(f"  {i}. {count} hits, {new} added → {query}")
+
+def fetch_sequential(seen):
+    path = ndjson.staging_path("europepmc_basic")
+    with ndjson.Writer(path) as writer:
+        for variant in QUERY_VARIANTS:
+            query = variant.format(FROM_DATE=FROM_DATE, TO_DATE=TO_DATE)
+            print(f"\n🔎 Trying query: {query}")
+            page = 1
+            total_new = 0
+
+            while True:
+                try:
+                    results, _ = fetch_page(query, page)
+                except Exception as e:
+                    print(f"❌ Page {page} failed: {e}")
+                    break
+
+                if not results:
+                    print(f"✅ No more records for this query on page {page}")
+                    break
+
+                new = []
+                for record in results:
+                    pmid = record.get("id")
+                    if pmid and pmid not in seen:
+                        seen.add(pmid)
+                        new.append(normalize_record(record))
+                writer.write_many(new)
+
+                print(f"→ Page {page}: {len(results)} results, {len(new)} new")
+                total_new += len(new)
+                page += 1
+
+            print(f"✅ Query completed with {total_new} new records.\n")
+
+            if total_new > 0:
+                break  # Stop at first query that returns results
+
+    http_client.print_summary()
+    return ndjson.iter_records(path)
+
+def fetch_publications(sequential=False):
+    seen = set()  # PMIDs already staged
+    records = fetch_sequential(seen) if sequential else fetch_all_variants(seen)
+    store.upsert(records, "EuropePMC")
+
+    print(f"💾 Final saved count: {len(seen)} unique records → {store.DB_PATH}")
 
 if __name__ == "__main__":
-    fetch_publications()
+    if "--replay" in sys.argv:
+        http_cache.set_replay()
+    # --sequential: old behaviour, stop at the first variant with results
+    fetch_publications(sequential="--sequential" in sys.argv)
@@ -0,0 +1,62 @@
+# etl/harvest_state.py
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX: the thread lock still covers one process
+    fcntl = None
+
+# Per-source watermark of the last successful harvest (absolute)
+STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "output", "harvest_state.json")
+
+# The harvest stages run side by side (and OpenAlex can run in its own
+# process), so every read-modify-write of the state file is serialized
+_lock = threading.Lock()
+
+@contextmanager
+def _locked():
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+        with open(STATE_FILE + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_state():
+    try:
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def get_watermark(source):
+    return load_state().get(source, {}).get("watermark")
+
+def set_watermark(source, watermark):
+    with _locked():
+        state = load_state()
+        state[source] = {"watermark": watermark, "updated": date.today().isoformat()}
+
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(STATE_FILE), prefix="harvest_state.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, STATE_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    print(f"🔖 {source} watermark → {watermark}")
+
+def today():
+    return date.today().isoformat()
@@ -0,0 +1,171 @@
+# etl/http_cache.py
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+
+try:
+    from etl import metrics
+except ImportError:  # run as a script from etl/
+    import metrics
+
+# Responses are stored as <key>.json (metadata) + <key>.body.gz (compressed body)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "output", ".http_cache")
+TTL = int(os.environ.get("HTTP_CACHE_TTL", 24 * 3600))  # seconds before revalidating
+STREAM_CHUNK = 64 * 1024
+# Credentials and contact details don't change the response
+IGNORED_PARAMS = {"api_key", "mailto"}
+
+# How each lookup was served, for the run report: hit (fresh entry),
+# revalidated (304), miss (fetched and stored), uncached (non-200 passed through)
+counters = {"hit": 0, "revalidated": 0, "miss": 0, "uncached": 0}
+_counters_lock = threading.Lock()
+
+class CacheMiss(Exception):
+    pass
+
+def _count(event):
+    with _counters_lock:
+        counters[event] += 1
+    metrics.add(f"http_cache_{event}", 1)
+
+class CachedResponse:
+    # Just enough of requests.Response for the fetchers. The body stays on
+    # disk until asked for, so open_body() can be parsed as a stream.
+    def __init__(self, url, status_code, headers, body_path):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body_path = body_path
+        self.from_cache = True
+
+    def open_body(self):
+        return gzip.open(self.body_path, "rb")
+
+    @property
+    def content(self):
+        with self.open_body() as f:
+            return f.read()
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} for url: {self.url}")
+
+def replay_enabled():
+    return os.environ.get("HTTP_CACHE_REPLAY") == "1"
+
+def set_replay(enabled=True):
+    # Kept in the environment so subprocess stages inherit it
+    os.environ["HTTP_CACHE_REPLAY"] = "1" if enabled else "0"
+    if enabled:
+        print("📼 Replay mode: serving API responses from the local cache only")
+
+def cache_key(url, params=None):
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in IGNORED_PARAMS)
+    return hashlib.sha256(f"{url}?{urlencode(items)}".encode("utf-8")).hexdigest()
+
+def _paths(key):
+    folder = os.path.join(CACHE_DIR, key[:2])
+    return os.path.join(folder, key + ".json"), os.path.join(folder, key + ".body.gz")
+
+def _read_meta(key):
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return meta if os.path.exists(body_path) else None
+
+def _write_meta(key, meta):
+    meta_path, _ = _paths(key)
+    tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def _load(key, meta):
+    _, body_path = _paths(key)
+    return CachedResponse(meta["url"], meta["status"], meta.get("headers", {}), body_path)
+
+def _store(key, url, params, response, stream=False):
+    meta_path, body_path = _paths(key)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+    # Unique per thread: two shards may fetch the same page at once
+    tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+    try:
+        with gzip.open(tmp_path, "wb") as f:
+            if stream:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK):
+                    f.write(chunk)
+            else:
+                f.write(response.content)
+        os.replace(tmp_path, body_path)
+    except BaseException:
+        os.unlink(tmp_path)  # a body cut off midway is fetched again
+        raise
+
+    headers = {k: v for k, v in response.headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+    meta = {
+        "url": url,
+        "params": {k: str(v) for k, v in (params or {}).items() if k not in IGNORED_PARAMS},
+        "status": response.status_code,
+        "headers": headers,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": time.time()
+    }
+    _write_meta(key, meta)
+    return _load(key, meta)
+
+def get(url, params=None, headers=None, timeout=None, stream=False, *, fetch):
+    # fetch is http_client.fetch: it retries, and runs settle() inside its
+    # retry loop so a streamed body is retried along with the request
+    key = cache_key(url, params)
+    meta = _read_meta(key)
+
+    if meta and (replay_enabled() or time.time() - meta["fetched_at"] < TTL):
+        _count("hit")
+        return _load(key, meta)
+    if replay_enabled():
+        raise CacheMiss(f"Not in HTTP cache (replay mode): {url} {params or ''}")
+
+    # Stale entry: revalidate with a conditional GET
+    request_headers = dict(headers or {})
+    if meta and meta.get("etag"):
+        request_headers["If-None-Match"] = meta["etag"]
+    if meta and meta.get("last_modified"):
+        request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    def settle(response):
+        if response.status_code == 304 and meta:
+            meta["fetched_at"] = time.time()
+            _write_meta(key, meta)
+            _count("revalidated")
+            return _load(key, meta)
+        if response.status_code == 200:
+            stored = _store(key, url, params, response, stream=stream)
+            _count("miss")
+            return stored
+        _count("uncached")
+        return response
+
+    # stream=True spools the body straight into the cache instead of memory
+    return fetch(url, params=params, headers=request_headers, timeout=timeout, stream=stream, handle=settle)
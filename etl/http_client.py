@@ -0,0 +1,207 @@
+# etl/http_client.py
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from etl import http_cache, metrics
+except ImportError:  # run as a script from etl/
+    import http_cache
+    import metrics
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0         # seconds, doubled per attempt with full jitter
+BACKOFF_CAP = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-host budget: maximum parallel requests and requests per second
+HOST_BUDGETS = {
+    "www.ebi.ac.uk": {"concurrency": 4, "rate": 10},
+    "api.openalex.org": {"concurrency": 4, "rate": 10},
+    # Local stand-in server (bench/mock_server.py): let throughput tests push it
+    "127.0.0.1": {"concurrency": 8, "rate": 500},
+    "localhost": {"concurrency": 8, "rate": 500},
+}
+DEFAULT_BUDGET = {"concurrency": 2, "rate": 5}
+
+class HostLimiter:
+    # Caps in-flight requests and request rate for one host, and adapts the
+    # concurrency limit AIMD-style: halve on 429, shrink when latency climbs
+    # well above its running average, grow back slowly on healthy responses.
+    def __init__(self, concurrency, rate):
+        self.max_concurrency = concurrency
+        self.limit = concurrency
+        self.interval = 1.0 / rate
+        self.in_flight = 0
+        self.next_slot = 0.0
+        self.latency_avg = None
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, status, latency):
+        with self.cond:
+            self.in_flight -= 1
+            if status == 429:
+                self.limit = max(1, self.limit // 2)
+            elif self.latency_avg and latency > 2 * self.latency_avg:
+                self.limit = max(1, self.limit - 1)
+            elif status is not None and status < 400:
+                self.limit = min(self.max_concurrency, self.limit + 1)
+            if status is not None and status < 400:
+                self.latency_avg = latency if self.latency_avg is None else 0.8 * self.latency_avg + 0.2 * latency
+            self.cond.notify_all()
+
+    def penalize(self, delay):
+        # Retry-After: hold every request to this host back, not just the retry
+        with self.cond:
+            self.next_slot = max(self.next_slot, time.monotonic() + delay)
+
+_sessions = {}
+_limiters = {}
+_lock = threading.Lock()
+
+stats = []  # one entry per network request
+_stats_lock = threading.Lock()
+
+def _host_state(host):
+    with _lock:
+        if host not in _sessions:
+            budget = HOST_BUDGETS.get(host, DEFAULT_BUDGET)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=budget["concurrency"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+            _limiters[host] = HostLimiter(budget["concurrency"], budget["rate"])
+        return _sessions[host], _limiters[host]
+
+def _record(host, url, status, nbytes, latency, attempt):
+    entry = {
+        "host": host,
+        "url": url,
+        "status": status,
+        "bytes": nbytes,
+        "latency": round(latency, 4),
+        "attempt": attempt
+    }
+    with _stats_lock:
+        stats.append(entry)
+    metrics.add("http_requests", 1)
+    metrics.add("http_retries", 1 if attempt else 0)
+    metrics.add("http_bytes", nbytes)
+    return entry
+
+def _count_stream(response, entry):
+    # A streamed body is only read later, so count its bytes as they go by
+    iter_content = response.iter_content
+
+    def counting_iter_content(chunk_size=1, decode_unicode=False):
+        for chunk in iter_content(chunk_size, decode_unicode):
+            entry["bytes"] += len(chunk)
+            metrics.add("http_bytes", len(chunk))
+            yield chunk
+
+    response.iter_content = counting_iter_content
+
+def _retry_delay(attempt, response):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_CAP)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def _retriable(error):
+    # A malformed URL or header (the ValueError ones) fails the same way
+    # every time; anything else on the wire is worth a retry
+    return not isinstance(error, (requests.HTTPError, ValueError))
+
+def fetch(url, params=None, headers=None, timeout=None, stream=False, handle=None):
+    # handle(response), when given, consumes the final response inside the
+    # retry loop and its result is returned: a streamed body that breaks off
+    # halfway is fetched again like any other failed request
+    host = urlsplit(url).hostname
+    session, limiter = _host_state(host)
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        started = time.monotonic()
+        response = error = None
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout or DEFAULT_TIMEOUT, stream=stream)
+        except requests.RequestException as e:
+            if not _retriable(e):
+                raise
+            error = e
+        finally:
+            # Whatever happened, the slot is freed, or the host's requests
+            # would block on it for good
+            latency = time.monotonic() - started
+            limiter.release(response.status_code if response is not None else None, latency)
+
+        if error is not None:
+            _record(host, url, None, 0, latency, attempt)
+            if attempt == MAX_RETRIES:
+                raise error
+            print(f"⚠️ {host}: {error.__class__.__name__}, retrying ({attempt + 1}/{MAX_RETRIES})")
+        else:
+            if stream:
+                entry = _record(host, response.url, response.status_code, 0, latency, attempt)
+                _count_stream(response, entry)
+            else:
+                _record(host, response.url, response.status_code, len(response.content), latency, attempt)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                if handle is None:
+                    return response
+                try:
+                    return handle(response)
+                except requests.RequestException as e:
+                    response.close()
+                    if not _retriable(e) or attempt == MAX_RETRIES:
+                        raise
+                    print(f"⚠️ {host}: {e.__class__.__name__} reading the body, retrying ({attempt + 1}/{MAX_RETRIES})")
+                    response = None
+            else:
+                response.close()
+                print(f"⚠️ {host}: HTTP {response.status_code}, retrying ({attempt + 1}/{MAX_RETRIES})")
+
+        delay = _retry_delay(attempt, response)
+        if response is not None and response.status_code == 429:
+            limiter.penalize(delay)
+        time.sleep(delay)
+
+def get(url, params=None, headers=None, timeout=None, cache=True, stream=False):
+    if not cache:
+        return fetch(url, params=params, headers=headers, timeout=timeout, stream=stream)
+    return http_cache.get(url, params=params, headers=headers, timeout=timeout, fetch=fetch, stream=stream)
+
+def summary():
+    with _stats_lock:
+        entries = list(stats)
+    by_host = {}
+    for entry in entries:
+        host = by_host.setdefault(entry["host"], {"requests": 0, "retries": 0, "bytes": 0, "latency": 0.0})
+        host["requests"] += 1
+        host["retries"] += 1 if entry["attempt"] else 0
+        host["bytes"] += entry["bytes"]
+        host["latency"] += entry["latency"]
+    return by_host
+
+def print_summary():
+    for host, s in summary().items():
+        avg = s["latency"] / s["requests"] if s["requests"] else 0
+        print(f"🌐 {host}: {s['requests']} requests, {s['retries']} retries, "
+              f"{s['bytes'] / 1024:.0f} KiB, avg latency {avg * 1000:.0f} ms")
@@ -1,82 +1,204 @@
 # etl/import_csv.py
+import hashlib
 import json
-import pandas as pd
+import os
+import sys
 from datetime import datetime
 
+try:
+    from etl import dedup, metrics, serialize, store
+    from etl.record import Publication
+except ImportError:  # run as a script: python etl/import_csv.py
+    import dedup
+    import metrics
+    import serialize
+    import store
+    from record import Publication
+
 EXCEL_FILE = "/root/renew-publications/reNEW_PUB.xlsx"
-JSON_FILE = "output/publications.json"
 SKIP_LOG = "output/skipped_entries.json"
 
+# CURIS column → record field; only these columns are read from the workbook
+COLUMNS = {
+    "Title of the contribution in original language": "title",
+    "Contributors-5": "authors",
+    "Journal > Journal-6": "journal",
+    "Current publication status > Date-3": "date",
+    "Electronic version(s) of this work > DOI (Digital Object Identifier)-12": "doi",
+}
+DATE_FORMATS = ["%d/%m/%Y"]
+
+# Normalized copy of the workbook kept next to it; bump the version
+# whenever normalization changes so old snapshots are ignored
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_VERSION = 3
+
+def is_blank(value):
+    # None from openpyxl, NaN/NaT from pandas (NaN != NaN)
+    return value is None or value != value
+
 def normalize_excel_row(row):
     def safe_str(value):
-        return str(value).strip() if pd.notna(value) else ""
+        return str(value).strip() if not is_blank(value) else ""
 
-    return {
-        "title": safe_str(row.get("Title of the contribution in original language", "")),
-        "authors": safe_str(row.get("Contributors-5", "")),
-        "journal": safe_str(row.get("Journal > Journal-6", "")),
-        "date": convert_date(row.get("Current publication status > Date-3", "")),
-        "doi": clean_doi(row.get("Electronic version(s) of this work > DOI (Digital Object Identifier)-12", "")),
-        "source": "Excel"
-    }
+    return Publication(
+        title=safe_str(row.get("Title of the contribution in original language", "")),
+        authors=safe_str(row.get("Contributors-5", "")),
+        journal=safe_str(row.get("Journal > Journal-6", "")),
+        date=convert_date(row.get("Current publication status > Date-3", "")),
+        doi=clean_doi(row.get("Electronic version(s) of this work > DOI (Digital Object Identifier)-12", "")),
+        source="Excel"
+    )
 
 def convert_date(raw_date):
-    try:
-        if isinstance(raw_date, datetime):
-            return raw_date.strftime("%Y-%m-%d")
-        return datetime.strptime(str(raw_date), "%d/%m/%Y").strftime("%Y-%m-%d")
-    except:
+    if is_blank(raw_date):
         return ""
+    if isinstance(raw_date, datetime):
+        return raw_date.strftime("%Y-%m-%d")
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(raw_date), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return ""
 
 def clean_doi(doi):
     if isinstance(doi, str) and doi.startswith("10."):
         return doi.strip()
     return ""
 
-def load_existing():
+def normalize_excel_frame(df):
+    # Column-wise equivalent of normalize_excel_row over the whole sheet
+    import pandas as pd
+
+    df = df.reindex(columns=list(COLUMNS)).rename(columns=COLUMNS)
+    out = pd.DataFrame(index=df.index)
+
+    for field in ("title", "authors", "journal"):
+        out[field] = df[field].fillna("").astype(str).str.strip()
+
+    # Cells already holding datetimes pass through any format unchanged
+    dates = pd.Series(pd.NaT, index=df.index)
+    for fmt in DATE_FORMATS:
+        dates = dates.fillna(pd.to_datetime(df["date"], format=fmt, errors="coerce"))
+    out["date"] = dates.dt.strftime("%Y-%m-%d").fillna("")
+
+    # .str yields NaN for non-string cells, which clean_doi also rejects
+    doi = df["doi"].astype(object)
+    out["doi"] = doi.str.strip().where(doi.str.startswith("10.", na=False), "")
+
+    out["source"] = "Excel"
+    return out
+
+def fingerprint(path, previous=None):
+    stat = os.stat(path)
+    fp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    # Same size and mtime: trust the recorded hash instead of rereading
+    if previous and previous.get("size") == fp["size"] and previous.get("mtime_ns") == fp["mtime_ns"]:
+        fp["sha256"] = previous["sha256"]
+        return fp
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    fp["sha256"] = digest.hexdigest()
+    return fp
+
+def load_snapshot():
+    # None when there is no usable snapshot. Decoding validates the columns, so a snapshot with unexpected ones is
+    # caught here and simply rebuilt.
     try:
-        with open(JSON_FILE, encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return []
-
-def deduplicate(items):
-    seen = set()
-    unique = []
-    for item in items:
-        key = item.get("doi") or (item.get("title", "").lower(), item.get("date", ""))
-        if key not in seen:
-            seen.add(key)
-            unique.append(item)
-    return unique
-
-def main():
-    print(f"📥 Loading Excel from {EXCEL_FILE}")
-    existing = load_existing()
+        records, meta = serialize.load(EXCEL_FILE + SNAPSHOT_SUFFIX)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring Excel snapshot: {e}")
+        return None
+    if meta.get("version") != SNAPSHOT_VERSION:
+        return None
+    return {"fingerprint": meta["fingerprint"], "records": records}
+
+def save_snapshot(fp, records):
+    path = EXCEL_FILE + SNAPSHOT_SUFFIX
+    try:
+        serialize.dump(path, records, meta={"version": SNAPSHOT_VERSION, "fingerprint": fp})
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not write Excel snapshot {path}: {e}")
 
-    df = pd.read_excel(EXCEL_FILE)
+def split_valid(records):
     excel_data = []
     skipped = []
-
-    for _, row in df.iterrows():
-        norm = normalize_excel_row(row)
-        if norm["title"] and norm["date"]:
+    for norm in records:
+        if norm.title and norm.date:
             excel_data.append(norm)
         else:
             skipped.append(norm)
+    return excel_data, skipped
 
-    print(f"🧹 Normalized {len(excel_data)} Excel records, Skipped: {len(skipped)}")
+def iter_workbook_rows(path):
+    # Read-only openpyxl streams rows from the sheet XML instead of loading
+    # the workbook; only the mapped CURIS columns are picked out of each row
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        positions = {name: i for i, name in enumerate(header) if name in COLUMNS}
+        for row in rows:
+            yield {name: row[i] if i < len(row) else None for name, i in positions.items()}
+    finally:
+        workbook.close()
+
+def read_streaming():
+    return split_valid(normalize_excel_row(row) for row in iter_workbook_rows(EXCEL_FILE))
+
+def read_with_pandas():
+    import pandas as pd
+
+    df = pd.read_excel(EXCEL_FILE, usecols=lambda column: column in COLUMNS)
+    normalized = normalize_excel_frame(df)
+    valid = (normalized["title"] != "") & (normalized["date"] != "")
+    return (
+        [Publication.from_dict(row) for row in normalized[valid].to_dict("records")],
+        [Publication.from_dict(row) for row in normalized[~valid].to_dict("records")],
+    )
+
+def read_excel_records(stream=False):
+    snapshot = load_snapshot()
+    fp = fingerprint(EXCEL_FILE, snapshot["fingerprint"] if snapshot else None)
+
+    if snapshot and snapshot["fingerprint"]["sha256"] == fp["sha256"]:
+        print("⚡ Workbook unchanged, using normalized snapshot")
+        records = snapshot["records"]
+        if snapshot["fingerprint"] != fp:
+            save_snapshot(fp, records)  # touched, not edited
+        return split_valid(records)
+
+    excel_data, skipped = read_streaming() if stream else read_with_pandas()
+    save_snapshot(fp, excel_data + skipped)
+    return excel_data, skipped
+
+def deduplicate(items):
+    return [found["record"] for found in dedup.cluster(items)]
 
-    merged = deduplicate(existing + excel_data)
+def main(stream=False):
+    print(f"📥 Loading Excel from {EXCEL_FILE}")
+
+    excel_data, skipped = read_excel_records(stream=stream)
+
+    print(f"🧹 Normalized {len(excel_data)} Excel records, Skipped: {len(skipped)}")
+    metrics.add("records_in", len(excel_data) + len(skipped))
 
-    with open(JSON_FILE, "w", encoding="utf-8") as f:
-        json.dump(merged, f, indent=2, ensure_ascii=False)
+    inserted, updated = store.upsert(excel_data, "Excel")
 
     with open(SKIP_LOG, "w", encoding="utf-8") as f:
-        json.dump(skipped, f, indent=2, ensure_ascii=False)
+        json.dump([pub.to_dict() for pub in skipped], f, indent=2, ensure_ascii=False)
 
-    print(f"✅ Imported {len(excel_data)} Excel entries, merged total: {len(merged)}")
+    print(f"✅ Imported {len(excel_data)} Excel entries ({inserted} new, {updated} already known)")
     print(f"⚠️ Skipped {len(skipped)} entries (see output/skipped_entries.json)")
 
 if __name__ == "__main__":
-    main()
+    # --stream: read the workbook row by row with openpyxl, without pandas
+    main(stream="--stream" in sys.argv)
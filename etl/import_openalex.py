@@ -1,71 +1,146 @@
-import requests
-import json
 import os
+import queue
+import sys
+import threading
 
-OUTPUT_FILE = "output/publications.json"
-OPENALEX_API = "https://api.openalex.org/works"
+try:
+    from etl import harvest_state, http_cache, http_client, json_stream, metrics, ndjson, store
+    from etl.record import Publication
+except ImportError:  # run as a script: python etl/import_openalex.py
+    import harvest_state
+    import http_cache
+    import http_client
+    import json_stream
+    import metrics
+    import ndjson
+    import store
+    from record import Publication
+
+# Overridable to point the harvest at a stand-in (bench/mock_server.py)
+OPENALEX_API = os.environ.get("OPENALEX_API_URL", "https://api.openalex.org/works")
 QUERY = 'title.search:reNEW'
 HEADERS = {"User-Agent": "mailto:richard.dennis@sund.ku.dk"}
-AFFILIATION_KEYWORDS = ["CPH", "UCPH", "University of Copenhagen"]
+# Affiliation is filtered server-side on institution lineage, so child
+# institutions (centres, departments) of the university match too
+INSTITUTION_IDS = ["I124055696"]  # University of Copenhagen (ROR 035b05819)
+AFFILIATION_FILTER = "authorships.institutions.lineage:" + "|".join(INSTITUTION_IDS)
+# Only the fields normalize_work reads
+SELECT_FIELDS = "id,doi,title,publication_date,authorships,primary_location"
+# Incremental runs only ask for works changed since the last harvest.
+# OpenAlex gates this filter behind an API key, read from OPENALEX_API_KEY;
+# without one every run is a full harvest (the filtered query is small).
+INCREMENTAL_FILTER = "from_updated_date"
+API_KEY = os.environ.get("OPENALEX_API_KEY")
+PIPELINE_DEPTH = 4  # spooled pages allowed to wait for the normalizer
+
+def normalize_work(item):
+    authors = "; ".join([(auth.get('author') or {}).get('display_name', '') for auth in item.get('authorships') or []])
+    title = (item.get('title') or '').strip()
+    journal = ((item.get('primary_location') or {}).get('source') or {}).get('display_name', '')
+    pub_date = item.get('publication_date') or ''
+    doi = item.get('doi')
+    return Publication(
+        title=title,
+        authors=authors,
+        journal=journal,
+        date=pub_date,
+        doi=doi,
+        source="OpenAlex"
+    )
 
-def fetch_openalex():
-    new_pubs = []
+def iter_page_works(response):
+    with response.open_body() as body:
+        for item in json_stream.iter_items(body, "results.item"):
+            yield normalize_work(item)
+
+def fetch_pages(query, pages, status):
+    # Producer: ask for the next cursor as soon as it is known and leave the
+    # normalizing to the consumer, so network and parsing overlap
     per_page = 200
     cursor = "*"
+    try:
+        while cursor:
+            params = {"filter": query, "select": SELECT_FIELDS, "per-page": per_page, "cursor": cursor}
+            if API_KEY:
+                params["api_key"] = API_KEY
+            print(f"Fetching: {OPENALEX_API}?filter={query}&per-page={per_page}&cursor={cursor}")
+            response = http_client.get(OPENALEX_API, params=params, headers=HEADERS, stream=True)
+            if response.status_code != 200:
+                print(f"❌ Error fetching data: {response.status_code}")
+                status["complete"] = False
+                break
+            # meta comes first in the body, so the cursor is read without
+            # decoding the results; the consumer streams those from disk
+            with response.open_body() as body:
+                cursor = json_stream.first_value(body, "meta.next_cursor")
+            pages.put(response)
+    except Exception as e:
+        status["error"] = e
+    finally:
+        pages.put(None)
+
+def fetch_openalex(since=None):
+    # Kept works are appended to the staging file as they are normalized;
+    # returns that file's path and whether the harvest ran to the end
+    staging = ndjson.staging_path("openalex")
     total_fetched = 0
+    status = {"complete": True, "error": None}
 
-    while True:
-        url = f"{OPENALEX_API}?filter={QUERY}&per-page={per_page}&cursor={cursor}"
-        print(f"Fetching: {url}")
-        response = requests.get(url, headers=HEADERS)
-        if response.status_code != 200:
-            print(f"❌ Error fetching data: {response.status_code}")
-            break
-        data = response.json()
-        results = data.get('results', [])
-        total_fetched += len(results)
-        for item in results:
-            authors = "; ".join([auth.get('author', {}).get('display_name', '') for auth in item.get('authorships', [])])
-            title = item.get('title', '').strip()
-            journal = item.get('host_venue', {}).get('display_name', '')
-            pub_date = item.get('publication_date', '')
-            doi = item.get('doi')
-            affiliations = " ".join([inst.get('display_name', '') for auth in item.get('authorships', []) for inst in auth.get('institutions', [])])
-            if any(keyword.lower() in affiliations.lower() for keyword in AFFILIATION_KEYWORDS):
-                pub = {
-                    "Authors": authors,
-                    "Title": title,
-                    "Journal": journal,
-                    "Pub Date": pub_date,
-                    "DOI": doi,
-                    "Source": "OpenAlex"
-                }
-                if title and pub_date:
-                    new_pubs.append(pub)
-        cursor = data.get('meta', {}).get('next_cursor')
-        if not cursor:
-            break
+    query = f"{QUERY},{AFFILIATION_FILTER}"
+    if since and API_KEY:
+        query += f",{INCREMENTAL_FILTER}:{since}"
+        print(f"🔖 Only fetching OpenAlex works updated since {since}")
+    elif since:
+        print(f"⚠️ OPENALEX_API_KEY is not set, so {INCREMENTAL_FILTER} is unavailable: running a full OpenAlex harvest")
 
-    print(f"✅ Fetched {total_fetched} OpenAlex publications (before filtering)")
-    print(f"✅ Filtered to {len(new_pubs)} publications with CPH/UCPH/University of Copenhagen affiliation")
-    return new_pubs
+    pages = queue.Queue(maxsize=PIPELINE_DEPTH)
+    producer = threading.Thread(target=metrics.stage_thread(fetch_pages), args=(query, pages, status), daemon=True)
+    producer.start()
 
-def merge_and_tag(new_pubs):
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-            existing = json.load(f)
-    else:
-        existing = []
+    def keep(works):
+        # Counts every work on the way past, passes on those worth staging
+        nonlocal total_fetched
+        for pub in works:
+            total_fetched += 1
+            if pub.title and pub.date:
+                yield pub
+
+    with ndjson.Writer(staging) as writer:
+        while True:
+            response = pages.get()
+            if response is None:
+                break
+            writer.write_many(keep(iter_page_works(response)))
 
-    openalex_titles = {pub['Title'].lower().strip() for pub in new_pubs}
-    updated_existing = [e for e in existing if e.get('Title', '').lower().strip() not in openalex_titles]
-    combined = updated_existing + new_pubs
+    producer.join()
+    if status["error"]:
+        raise status["error"]
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(combined, f, ensure_ascii=False, indent=2)
+    http_client.print_summary()
+    metrics.add("records_in", total_fetched)
+    print(f"✅ Fetched {total_fetched} OpenAlex publications with a University of Copenhagen affiliation")
+    print(f"✅ Kept {writer.count} publications with a title and publication date")
+    return staging, status["complete"]
+
+def merge_and_tag(new_pubs):
+    inserted, updated = store.upsert(new_pubs, "OpenAlex")
+    print(f"✅ Added {inserted} OpenAlex records, refreshed {updated}")
 
-    print(f"✅ Added {len(new_pubs)} OpenAlex records. Total records: {len(combined)}")
+def harvest(full=False):
+    started = harvest_state.today()
+    # A replay asks for what a recorded full harvest did; the watermark has
+    # moved on since
+    full = full or http_cache.replay_enabled()
+    since = None if full or not store.has_source("OpenAlex") else harvest_state.get_watermark("openalex")
+    staging, complete = fetch_openalex(since)
+    merge_and_tag(ndjson.iter_records(staging))
+    # A partial or replayed harvest must be retried from the old watermark
+    if complete and not http_cache.replay_enabled():
+        harvest_state.set_watermark("openalex", started)
 
 if __name__ == "__main__":
-    pubs = fetch_openalex()
-    merge_and_tag(pubs)
+    if "--replay" in sys.argv:
+        http_cache.set_replay()
+    # Run by the pipeline with --isolate-openalex, it reports its own metrics
+    with metrics.subprocess_stage("openalex"):
+        harvest(full="--full" in sys.argv)
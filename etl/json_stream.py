@@ -0,0 +1,34 @@
+# etl/json_stream.py
+import json
+
+try:
+    import ijson
+except ImportError:  # falls back to whole-document parsing
+    ijson = None
+
+# Prefixes use ijson's dotted notation, e.g. "resultList.result.item"
+
+def _walk(document, prefix):
+    node = document
+    for part in prefix.split("."):
+        if part == "item":
+            return node or []
+        node = (node or {}).get(part)
+    return node
+
+def iter_items(stream, prefix):
+    # Yields one array element at a time without materializing the page
+    if ijson is None:
+        yield from _walk(json.load(stream), prefix)
+        return
+    yield from ijson.items(stream, prefix, use_float=True)
+
+def first_value(stream, prefix):
+    # Stops reading as soon as the value is found, so a field near the top
+    # of the document (a cursor, a hit count) costs almost nothing
+    if ijson is None:
+        return _walk(json.load(stream), prefix)
+    for path, event, value in ijson.parse(stream, use_float=True):
+        if path == prefix and event in ("string", "number", "boolean", "null"):
+            return value
+    return None
@@ -0,0 +1,251 @@
+# etl/metrics.py
+import json
+import os
+import resource
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_PATH = os.path.join(BASE_DIR, "output", "run_report.json")
+# Point PROMETHEUS_TEXTFILE at the node_exporter / Netdata textfile
+# collector directory; STATSD_HOST (host:port) feeds Netdata's statsd plugin
+TEXTFILE_PATH = os.environ.get("PROMETHEUS_TEXTFILE") or os.path.join(BASE_DIR, "output", "metrics.prom")
+STATSD_HOST = os.environ.get("STATSD_HOST")
+PREFIX = "renew"
+RSS_INTERVAL = 0.05  # seconds between RSS samples
+# A stage run in its own interpreter (--isolate-openalex) writes its
+# figures to the file this names, for the parent stage to merge
+CHILD_METRICS_ENV = "RENEW_STAGE_METRICS"
+
+stages = {}  # name -> metrics of that stage in this run
+_lock = threading.Lock()
+_current = threading.local()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _rss():
+    # Current resident set size in bytes; Linux only, else the process peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _RssSampler:
+    # One background thread raising the peak of every stage still running.
+    # Memory can't be told apart per thread, so this is the whole process's
+    # peak while the stage ran, shared by stages running side by side.
+    def __init__(self):
+        self.active = set()
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def _loop(self):
+        with self.cond:
+            while self.active:
+                rss = _rss()
+                with _lock:
+                    for name in self.active:
+                        stage = stages[name]
+                        stage["process_peak_rss_bytes"] = max(stage["process_peak_rss_bytes"], rss)
+                self.cond.wait(RSS_INTERVAL)
+            self.thread = None
+
+    def watch(self, name):
+        with self.cond:
+            self.active.add(name)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+
+    def unwatch(self, name):
+        with self.cond:
+            self.active.discard(name)
+            self.cond.notify_all()
+
+_sampler = _RssSampler()
+
+@contextmanager
+def track(name):
+    # Wall time, CPU time and peak RSS of one stage. CPU time is counted per
+    # thread: the stage's own plus its workers' (see stage_thread).
+    with _lock:
+        stages[name] = {"status": "running", "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                        "process_peak_rss_bytes": _rss(), "records_in": 0, "records_out": 0,
+                        "http_requests": 0, "http_retries": 0, "http_bytes": 0}
+    _current.stage = name
+    _sampler.watch(name)
+    wall, cpu = time.monotonic(), time.thread_time()
+    try:
+        yield stages[name]
+    finally:
+        _sampler.unwatch(name)
+        _current.stage = None
+        with _lock:
+            stage = stages[name]
+            stage["wall_seconds"] = round(time.monotonic() - wall, 4)
+            stage["cpu_seconds"] = round(stage["cpu_seconds"] + time.thread_time() - cpu, 4)
+            stage["process_peak_rss_bytes"] = max(stage["process_peak_rss_bytes"], _rss())
+
+def stage_thread(func):
+    # Wraps func for a worker thread a stage starts, so what the worker
+    # counts (HTTP requests, CPU time) is put down to that stage
+    name = getattr(_current, "stage", None)
+    if name is None:
+        return func
+
+    def run(*args, **kwargs):
+        _current.stage = name
+        cpu = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add("cpu_seconds", time.thread_time() - cpu)
+            _current.stage = None
+
+    return run
+
+@contextmanager
+def subprocess_stage(name):
+    # Tracks a stage module run as a script by the pipeline, and leaves its
+    # figures for the parent's stage; a no-op when run by hand
+    path = os.environ.get(CHILD_METRICS_ENV)
+    if not path:
+        yield
+        return
+    try:
+        with track(name):
+            yield
+    finally:
+        _write_atomic(path, json.dumps(stages[name]))
+
+def merge_child(path):
+    # Folds a subprocess stage's figures into the stage on this thread
+    name = getattr(_current, "stage", None)
+    try:
+        with open(path, encoding="utf-8") as f:
+            child = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    if name is None:
+        return
+    with _lock:
+        stage = stages[name]
+        for key, value in child.items():
+            if key == "process_peak_rss_bytes":
+                stage[key] = max(stage[key], value)  # the child is the stage's own process
+            elif key not in ("status", "wall_seconds"):
+                stage[key] = round(stage.get(key, 0) + value, 4)
+
+def add(counter, n):
+    # Adds to a counter of the stage running on this thread; a no-op when
+    # a module runs on its own, outside the pipeline
+    name = getattr(_current, "stage", None)
+    if name is None:
+        return
+    with _lock:
+        stages[name][counter] = stages[name].get(counter, 0) + n
+
+def set_status(name, status):
+    with _lock:
+        if name in stages:
+            stages[name]["status"] = status
+
+def build_report(started, duration):
+    # Imported here: both report into this module as they run
+    try:
+        from etl import http_cache, http_client
+    except ImportError:  # run as a script from etl/
+        import http_cache
+        import http_client
+
+    cache = dict(http_cache.counters)
+    lookups = sum(cache.values())
+    with _lock:
+        stage_report = {name: dict(values) for name, values in stages.items()}
+    return {
+        "started": datetime.fromtimestamp(started, timezone.utc).isoformat(timespec="seconds"),
+        "duration_seconds": round(duration, 4),
+        "stages": stage_report,
+        # Totals over every stage; each stage also has its own http_* counts
+        "http": http_client.summary(),
+        "http_cache": dict(cache, hit_rate=round((cache["hit"] + cache["revalidated"]) / lookups, 4) if lookups else None),
+    }
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+def prometheus_text(report):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{PREFIX}_{name}{{{label_text}}} {value}" if label_text else f"{PREFIX}_{name} {value}")
+
+    stage_items = report["stages"].items()
+    metric("pipeline_duration_seconds", "gauge", "Wall time of the last pipeline run", [({}, report["duration_seconds"])])
+    metric("pipeline_last_run_timestamp_seconds", "gauge", "Unix time the last pipeline run started",
+           [({}, int(datetime.fromisoformat(report["started"]).timestamp()))])
+    metric("stage_wall_seconds", "gauge", "Wall time per stage", [({"stage": n}, s["wall_seconds"]) for n, s in stage_items])
+    metric("stage_cpu_seconds", "gauge", "CPU time of each stage's threads", [({"stage": n}, s["cpu_seconds"]) for n, s in stage_items])
+    metric("stage_process_peak_rss_bytes", "gauge",
+           "Peak resident memory of the whole process while each stage ran, shared by concurrent stages",
+           [({"stage": n}, s["process_peak_rss_bytes"]) for n, s in stage_items])
+    metric("stage_records_in", "gauge", "Records read by each stage", [({"stage": n}, s["records_in"]) for n, s in stage_items])
+    metric("stage_records_out", "gauge", "Records written by each stage", [({"stage": n}, s["records_out"]) for n, s in stage_items])
+    metric("stage_success", "gauge", "1 if the stage ran or was cached, 0 if it failed",
+           [({"stage": n}, int(s["status"] in ("ok", "cached"))) for n, s in stage_items])
+    metric("stage_cached", "gauge", "1 if the stage was skipped with unchanged inputs",
+           [({"stage": n}, int(s["status"] == "cached")) for n, s in stage_items])
+    metric("stage_http_requests", "gauge", "HTTP requests made by each stage", [({"stage": n}, s["http_requests"]) for n, s in stage_items])
+    metric("stage_http_retries", "gauge", "HTTP retries made by each stage", [({"stage": n}, s["http_retries"]) for n, s in stage_items])
+    metric("stage_http_bytes", "gauge", "HTTP response bytes read by each stage", [({"stage": n}, s["http_bytes"]) for n, s in stage_items])
+    events = [event for event in report["http_cache"] if event != "hit_rate"]
+    metric("stage_http_cache_lookups", "gauge", "HTTP cache lookups by stage and outcome",
+           [({"stage": n, "event": event}, s.get(f"http_cache_{event}", 0)) for n, s in stage_items for event in events])
+    hosts = report["http"].items()
+    metric("http_requests", "gauge", "HTTP requests in the last run, all stages", [({"host": h}, s["requests"]) for h, s in hosts])
+    metric("http_retries", "gauge", "HTTP retries in the last run, all stages", [({"host": h}, s["retries"]) for h, s in hosts])
+    metric("http_bytes", "gauge", "HTTP response bytes in the last run, all stages", [({"host": h}, s["bytes"]) for h, s in hosts])
+    metric("http_latency_seconds", "gauge", "Summed HTTP latency in the last run, all stages", [({"host": h}, round(s["latency"], 4)) for h, s in hosts])
+    cache = report["http_cache"]
+    metric("http_cache_lookups", "gauge", "HTTP cache lookups by outcome, all stages",
+           [({"event": event}, cache[event]) for event in events])
+    return "\n".join(lines) + "\n"
+
+def send_statsd(report, address):
+    # Gauges over UDP: fire and forget, a missing daemon costs nothing
+    host, _, port = address.partition(":")
+    packets = [f"{PREFIX}.pipeline.duration_seconds:{report['duration_seconds']}|g"]
+    for name, s in report["stages"].items():
+        for key in ("wall_seconds", "cpu_seconds", "process_peak_rss_bytes", "records_in", "records_out",
+                    "http_requests", "http_retries", "http_bytes"):
+            packets.append(f"{PREFIX}.stage.{name}.{key}:{s[key]}|g")
+    for host_name, s in report["http"].items():
+        safe = host_name.replace(".", "_")
+        for key in ("requests", "retries", "bytes"):
+            packets.append(f"{PREFIX}.http.{safe}.{key}:{s[key]}|g")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for packet in packets:
+            try:
+                sock.sendto(packet.encode(), (host, int(port or 8125)))
+            except OSError as e:
+                print(f"⚠️ statsd {address}: {e}")
+                return
+
+def write_report(started, duration):
+    report = build_report(started, duration)
+    _write_atomic(REPORT_PATH, json.dumps(report, indent=2))
+    _write_atomic(TEXTFILE_PATH, prometheus_text(report))
+    if STATSD_HOST:
+        send_statsd(report, STATSD_HOST)
+    print(f"📈 Run report → {REPORT_PATH}, metrics → {TEXTFILE_PATH}")
+    return report
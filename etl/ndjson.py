@@ -0,0 +1,84 @@
+# etl/ndjson.py
+import json
+import os
+import threading
+from itertools import islice
+
+try:
+    from etl.record import Publication
+except ImportError:  # run as a script from etl/
+    from record import Publication
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fetchers stage each run's records here, one file per source
+STAGING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "staging")
+WRITE_CHUNK = 100  # records encoded and written per lock hold
+
+# One compact JSON object per line. Each record is written with a single
+# write() of a complete line, so a crash can only ever leave a torn last
+# line behind, and readers drop that line instead of losing the file.
+
+def staging_path(source):
+    return os.path.join(STAGING_DIR, f"{source}.ndjson")
+
+def encode_line(pub):
+    if orjson is not None:
+        return orjson.dumps(pub.to_dict()) + b"\n"
+    return json.dumps(pub.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+class Writer:
+    # Starts the file afresh and appends records as they arrive; safe to
+    # share between fetcher threads
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+
+    def write(self, pub):
+        line = encode_line(pub)
+        with self._lock:
+            self._file.write(line)
+            self.count += 1
+
+    def write_many(self, pubs):
+        # Takes records as they are produced, a small chunk at a time, so a
+        # page of results is never held whole; returns how many were written
+        pubs = iter(pubs)
+        written = 0
+        for chunk in iter(lambda: list(islice(pubs, WRITE_CHUNK)), []):
+            data = b"".join(map(encode_line, chunk))
+            with self._lock:
+                self._file.write(data)
+                self.count += len(chunk)
+            written += len(chunk)
+        with self._lock:
+            self._file.flush()  # a fetched page is on disk before the next one
+        return written
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_records(path):
+    # Streams Publications back one line at a time
+    with open(path, "rb") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.endswith(b"\n"):
+                print(f"⚠️ {os.path.basename(path)}: dropping torn record on line {number}")
+                return
+            if line.strip():
+                yield Publication.from_dict(orjson.loads(line) if orjson is not None else json.loads(line))
@@ -0,0 +1,78 @@
+# etl/record.py
+import sys
+from operator import attrgetter
+
+# The one record shape every stage reads and writes, in column order
+FIELDS = ("title", "authors", "journal", "date", "doi", "pmid", "source")
+_FIELD_SET = frozenset(FIELDS)
+_as_row = attrgetter(*FIELDS)
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+class Publication:
+    # Slots keep a large corpus compact and make an unknown field an error
+    # instead of a silently ignored key. Journal and source names repeat
+    # across thousands of records, so each distinct string is stored once.
+    __slots__ = FIELDS
+
+    def __init__(self, title="", authors="", journal="", date="", doi="", pmid="", source=""):
+        self.title = _text(title)
+        self.authors = _text(authors)
+        self.journal = sys.intern(_text(journal))
+        self.date = _text(date)
+        self.doi = _text(doi)
+        self.pmid = _text(pmid)
+        self.source = sys.intern(_text(source))
+
+    @classmethod
+    def from_dict(cls, data):
+        unknown = data.keys() - _FIELD_SET
+        if unknown:
+            raise ValueError(f"Unknown publication field(s): {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_dict(self):
+        return dict(zip(FIELDS, _as_row(self)))
+
+    def to_row(self):
+        return _as_row(self)
+
+    def copy(self):
+        return Publication(*_as_row(self))
+
+    def fill_from(self, other):
+        # Keep what this record has, take the other's values for the gaps
+        for field in FIELDS:
+            if not getattr(self, field):
+                setattr(self, field, getattr(other, field))
+
+    def __eq__(self, other):
+        if not isinstance(other, Publication):
+            return NotImplemented
+        return _as_row(self) == _as_row(other)
+
+    # Records are merged in place (fill_from), so a hash of their values
+    # would go stale inside a set or dict. Key those by doi/pmid, or by
+    # to_row() for a snapshot of the whole record.
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Publication({self.title[:40]!r}, doi={self.doi!r}, source={self.source!r})"
+
+def to_columns(pubs):
+    # Column-wise encoding: one list per field, no per-record keys
+    rows = [_as_row(pub) for pub in pubs]
+    return {field: list(values) for field, values in zip(FIELDS, zip(*rows))} if rows else {field: [] for field in FIELDS}
+
+def from_columns(columns):
+    unknown = columns.keys() - _FIELD_SET
+    if unknown:
+        raise ValueError(f"Unknown publication field(s): {', '.join(sorted(unknown))}")
+    count = len(next(iter(columns.values()), ()))
+    ordered = [columns[field] if field in columns else [""] * count for field in FIELDS]
+    return list(map(Publication, *ordered))
@@ -0,0 +1,116 @@
+# etl/serialize.py
+import gzip
+import json
+import os
+import time
+import zlib
+
+try:
+    from etl.record import from_columns, to_columns
+except ImportError:  # run as a script from etl/
+    from record import from_columns, to_columns
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Intermediate datasets are for the next stage, not for people: compact,
+# column-wise and as fast as the installed libraries allow. The indented
+# publications.json stays as the human-facing export.
+MAGIC = b"PUBDATA"
+CODEC_ENV = "DATASET_CODEC"              # orjson | msgpack | json
+COMPRESSION_ENV = "DATASET_COMPRESSION"  # none | zstd | gzip
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+CODECS = {"json": (_json_dumps, json.loads)}
+if orjson is not None:
+    CODECS["orjson"] = (orjson.dumps, orjson.loads)
+if msgpack is not None:
+    CODECS["msgpack"] = (lambda obj: msgpack.packb(obj, use_bin_type=True), lambda data: msgpack.unpackb(data, raw=False))
+
+COMPRESSIONS = {
+    "none": (lambda data: data, lambda data: data),
+    "gzip": (lambda data: gzip.compress(data, compresslevel=1), gzip.decompress),
+}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (zstandard.ZstdCompressor(level=3).compress, lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+# Errors a truncated or corrupt payload raises while being decompressed
+DECOMPRESS_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+def _from_env(env, table, fallback):
+    # A setting naming a codec that is not installed falls back rather than
+    # failing the stage that writes the dataset
+    name = os.environ.get(env)
+    if name and name not in table:
+        print(f"⚠️ {env}={name} is unknown or not installed (available: {', '.join(table)}); using {fallback}")
+        return fallback
+    return name or fallback
+
+def default_codec():
+    return _from_env(CODEC_ENV, CODECS, next(name for name in ("orjson", "msgpack", "json") if name in CODECS))
+
+def default_compression():
+    return _from_env(COMPRESSION_ENV, COMPRESSIONS, "none")
+
+def _lookup(table, name, kind):
+    if name not in table:
+        raise ValueError(f"Unknown or unavailable {kind} {name!r} (available: {', '.join(table)})")
+    return table[name]
+
+def dump(path, pubs, meta=None, codec=None, compression=None):
+    # pubs can be any iterable, so a store cursor is encoded without first
+    # being held as a list of records
+    codec = codec or default_codec()
+    compression = compression or default_compression()
+    encode, _ = _lookup(CODECS, codec, "codec")
+    compress, _ = _lookup(COMPRESSIONS, compression, "compression")
+
+    started = time.perf_counter()
+    columns = to_columns(pubs)
+    count = len(next(iter(columns.values()), ()))
+    payload = compress(encode({"meta": meta or {}, "columns": columns}))
+    elapsed = time.perf_counter() - started
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"%s %s %s\n" % (MAGIC, codec.encode(), compression.encode()))
+        f.write(payload)
+    os.replace(tmp_path, path)
+    print(f"📦 Wrote {count} records → {os.path.basename(path)} "
+          f"({codec}/{compression}, {len(payload) / 1024:.0f} KiB, {elapsed * 1000:.0f} ms)")
+    return count
+
+def load(path):
+    # Returns (publications, meta); the header names the codec, so files
+    # written with any installed codec read back without configuration
+    with open(path, "rb") as f:
+        header = f.readline().split()
+        if len(header) != 3 or header[0] != MAGIC:
+            raise ValueError(f"{path} is not a serialized dataset")
+        codec, compression = header[1].decode(), header[2].decode()
+        _, decode = _lookup(CODECS, codec, "codec")
+        _, decompress = _lookup(COMPRESSIONS, compression, "compression")
+        payload = f.read()
+
+    started = time.perf_counter()
+    try:
+        document = decode(decompress(payload))
+    except DECOMPRESS_ERRORS as e:
+        raise ValueError(f"{path} is corrupt: {e}") from e
+    pubs = from_columns(document["columns"])
+    elapsed = time.perf_counter() - started
+    print(f"📦 Read {len(pubs)} records ← {os.path.basename(path)} "
+          f"({codec}/{compression}, {len(payload) / 1024:.0f} KiB, {elapsed * 1000:.0f} ms)")
+    return pubs, document["meta"]
@@ -0,0 +1,310 @@
+# etl/store.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+try:
+    from etl import dedup, metrics, serialize
+    from etl.record import FIELDS, Publication
+except ImportError:  # run as a script: python etl/store.py
+    import dedup
+    import metrics
+    import serialize
+    from record import FIELDS, Publication
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(BASE_DIR, "output", "publications.sqlite")
+EXPORT_PATH = os.path.join(BASE_DIR, "output", "publications.json")
+# Compact copy of the export for later stages; see etl/serialize.py
+DATASET_PATH = os.path.join(BASE_DIR, "output", "publications.dataset")
+
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS publications (
+    id         INTEGER PRIMARY KEY,
+    title      TEXT,
+    authors    TEXT,
+    journal    TEXT,
+    date       TEXT,
+    doi        TEXT,
+    pmid       TEXT,
+    source     TEXT,
+    doi_key    TEXT,
+    title_key  TEXT,
+    updated_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS publications_doi_key ON publications(doi_key) WHERE doi_key IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS publications_pmid ON publications(pmid) WHERE pmid IS NOT NULL;
+-- Not unique: a title alone ("Editorial", "Correction") can name many works
+CREATE INDEX IF NOT EXISTS publications_title ON publications(title_key) WHERE title_key IS NOT NULL;
+
+-- Every source's own copy of a record, so merges stay explainable
+CREATE TABLE IF NOT EXISTS provenance (
+    publication_id INTEGER NOT NULL REFERENCES publications(id) ON DELETE CASCADE,
+    source         TEXT NOT NULL,
+    record         TEXT NOT NULL,
+    seen_at        REAL NOT NULL,
+    PRIMARY KEY (publication_id, source)
+);
+"""
+
+def bare_doi(doi):
+    # Display form: resolver prefix stripped, original case kept
+    doi = dedup.DOI_PREFIX.sub("", str(doi or "").strip())
+    return doi if doi.startswith("10.") else ""
+
+def connect(path=None):
+    path = path or DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # WAL lets the export read while a harvest stage is writing
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+def _migrate(conn):
+    # Stores from before title matches checked dates kept title_key unique,
+    # so later works with a repeated title were stored without one
+    old_index = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'publications_title_key'"
+    if not conn.execute(old_index).fetchone():
+        return
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute(old_index).fetchone():  # another stage may have got here first
+            conn.execute("DROP INDEX publications_title_key")
+            rows = conn.execute("SELECT id, title FROM publications WHERE title_key IS NULL").fetchall()
+            conn.executemany("UPDATE publications SET title_key = ? WHERE id = ?",
+                             [(dedup.normalize_title(row["title"]) or None, row["id"]) for row in rows])
+
+class _LazyIndex:
+    # Fuzzy title index over the store, built on first use only: batches
+    # that match on exact keys never pay for it
+    def __init__(self, conn):
+        self.conn = conn
+        self.index = None
+        self.last_id = 0
+
+    def _load(self, rows):
+        pubs = [Publication(title=row["title"], date=row["date"], doi=row["doi"], pmid=row["pmid"]) for row in rows]
+        with dedup.bulk_build():
+            for row, item in zip(rows, dedup.prepare_all(pubs)):
+                self.add(row["id"], item)
+
+    def catch_up(self):
+        # Rows other stages inserted since the index was built; ids only grow
+        if self.index is not None:
+            self._load(self.conn.execute(
+                "SELECT id, title, date, doi, pmid FROM publications WHERE id > ?", (self.last_id,)
+            ).fetchall())
+
+    def match(self, pub):
+        if self.index is None:
+            self.index = dedup.DedupIndex()
+            self._load(self.conn.execute("SELECT id, title, date, doi, pmid FROM publications").fetchall())
+        return self.index.match(pub)
+
+    def add(self, key, pub):
+        if self.index is not None:
+            self.index.add(key, pub)
+            self.last_id = max(self.last_id, key)
+
+def _same_work(row, prepared):
+    # Whether a row found by title alone can be this record: the years must
+    # agree, a different DOI is a different work, and a record without a DOI
+    # is never folded into a row that has one
+    if dedup.publication_year(row["date"]) != prepared.year:
+        return False
+    return not row["doi_key"] or row["doi_key"] == prepared.doi
+
+def _find(conn, prepared):
+    # (row, matched_by_title) for the stored record this one refers to
+    if prepared.doi:
+        row = conn.execute("SELECT * FROM publications WHERE doi_key = ?", (prepared.doi,)).fetchone()
+        if row:
+            return row, False
+    if prepared.pmid:
+        row = conn.execute("SELECT * FROM publications WHERE pmid = ?", (prepared.pmid,)).fetchone()
+        if row:
+            return row, False
+    if prepared.title:
+        for row in conn.execute("SELECT * FROM publications WHERE title_key = ? ORDER BY id", (prepared.title,)):
+            if _same_work(row, prepared):
+                return row, True
+    return None, False
+
+def _is_free(conn, column, value, row_id):
+    if value is None:
+        return True
+    return conn.execute(f"SELECT 1 FROM publications WHERE {column} = ? AND id != ?", (value, row_id)).fetchone() is None
+
+def _upsert_one(conn, pub, source, now, fuzzy):
+    prepared = dedup.prepare(pub)
+    doi_key = prepared.doi or None
+    pmid = prepared.pmid or None
+    tkey = prepared.title or None
+    values = {field: value or None for field, value in zip(FIELDS, pub.to_row())}
+    values["doi"] = bare_doi(pub.doi) or None
+    values["pmid"] = pmid
+    values["source"] = source
+
+    row, by_title = _find(conn, prepared)
+    if row is None:
+        # Near-duplicate titles (punctuation, markup, typos) via MinHash/LSH
+        match = fuzzy.match(prepared)
+        if match is not None:
+            row = conn.execute("SELECT * FROM publications WHERE id = ?", (match,)).fetchone()
+            row, by_title = (row, True) if row is not None and _same_work(row, prepared) else (None, False)
+    if row is None:
+        cur = conn.execute(
+            "INSERT INTO publications (title, authors, journal, date, doi, pmid, source, doi_key, title_key, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [values[f] for f in FIELDS] + [doi_key, tkey, now]
+        )
+        publication_id = cur.lastrowid
+        inserted = True
+    else:
+        # The owning source refreshes its record; other sources, and a match
+        # on title alone, only fill gaps
+        refresh = row["source"] == source and not by_title
+        merged = {}
+        for field in FIELDS:
+            if field == "source":
+                continue
+            if refresh:
+                merged[field] = values[field] or row[field]
+            else:
+                merged[field] = row[field] or values[field]
+        # Never take over a DOI or PMID another row already owns
+        merged_key = dedup.normalize_doi(merged["doi"]) or None
+        if merged_key != row["doi_key"] and not _is_free(conn, "doi_key", merged_key, row["id"]):
+            merged["doi"], merged_key = row["doi"], row["doi_key"]
+        if merged["pmid"] != row["pmid"] and not _is_free(conn, "pmid", merged["pmid"], row["id"]):
+            merged["pmid"] = row["pmid"]
+        conn.execute(
+            "UPDATE publications SET title = ?, authors = ?, journal = ?, date = ?, doi = ?, pmid = ?,"
+            " doi_key = ?, updated_at = ? WHERE id = ?",
+            [merged[f] for f in FIELDS if f != "source"] + [merged_key, now, row["id"]]
+        )
+        publication_id = row["id"]
+        inserted = False
+
+    conn.execute(
+        "INSERT OR REPLACE INTO provenance (publication_id, source, record, seen_at) VALUES (?, ?, ?, ?)",
+        (publication_id, source, json.dumps(pub.to_dict(), ensure_ascii=False), now)
+    )
+    fuzzy.add(publication_id, prepared)
+    return inserted
+
+def upsert(records, source, conn=None):
+    own_conn = conn is None
+    conn = conn or connect()
+    inserted = updated = 0
+    now = time.time()
+    batch = []
+    fuzzy = _LazyIndex(conn)
+
+    def flush():
+        nonlocal inserted, updated
+        if not batch:
+            return
+        with conn:  # one transaction per batch
+            # Take the write lock up front so sources upserting concurrently
+            # take turns per batch, and see each other's rows before matching
+            conn.execute("BEGIN IMMEDIATE")
+            fuzzy.catch_up()
+            for pub in batch:
+                if _upsert_one(conn, pub, source, now, fuzzy):
+                    inserted += 1
+                else:
+                    updated += 1
+        batch.clear()
+
+    for pub in records:
+        batch.append(pub)
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    if own_conn:
+        conn.close()
+    metrics.add("records_out", inserted + updated)
+    print(f"🗄️ {source}: {inserted} new, {updated} updated in {os.path.basename(DB_PATH)}")
+    return inserted, updated
+
+def has_source(source, conn=None):
+    own_conn = conn is None
+    conn = conn or connect()
+    found = conn.execute("SELECT 1 FROM provenance WHERE source = ? LIMIT 1", (source,)).fetchone()
+    if own_conn:
+        conn.close()
+    return found is not None
+
+def content_digest(conn=None):
+    # Changes exactly when the exported records would; timestamps and
+    # provenance bookkeeping are left out
+    own_conn = conn is None
+    conn = conn or connect()
+    digest = hashlib.sha256()
+    for row in conn.execute("SELECT " + ", ".join(FIELDS) + " FROM publications ORDER BY id"):
+        digest.update(json.dumps(tuple(row), ensure_ascii=False).encode("utf-8"))
+    if own_conn:
+        conn.close()
+    return digest.hexdigest()
+
+def iter_publications(conn=None):
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        for row in conn.execute("SELECT " + ", ".join(FIELDS) + " FROM publications ORDER BY id"):
+            yield Publication.from_row(row)
+    finally:
+        if own_conn:
+            conn.close()
+
+# A record is a flat dict of strings, so the C encoder with newline
+# separators lays it out exactly as indent=2 would inside the list
+_RECORD_JSON = json.JSONEncoder(ensure_ascii=False, separators=(",\n    ", ": "))
+
+def export_json(records=None, path=None):
+    # Written a record at a time, to the same bytes json.dump(indent=2)
+    # would give for the whole list
+    path = path or EXPORT_PATH
+    records = iter_publications() if records is None else records
+    started = time.perf_counter()
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for pub in records:
+            f.write(",\n  " if count else "\n  ")
+            f.write("{\n    " + _RECORD_JSON.encode(pub.to_dict())[1:-1] + "\n  }")
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp_path, path)
+    elapsed = time.perf_counter() - started
+    print(f"💾 Exported {count} publications → {path} "
+          f"({os.path.getsize(path) / 1024:.0f} KiB, {elapsed * 1000:.0f} ms)")
+    return count
+
+def export_dataset(records=None, path=None):
+    return serialize.dump(path or DATASET_PATH, iter_publications() if records is None else records)
+
+def load_dataset(path=None):
+    # Falls back to the JSON export when no dataset has been written yet
+    path = path or DATASET_PATH
+    if not os.path.exists(path):
+        with open(EXPORT_PATH, encoding="utf-8") as f:
+            return [Publication.from_dict(item) for item in json.load(f)]
+    records, _ = serialize.load(path)
+    return records
+
+if __name__ == "__main__":
+    export_json()
+    export_dataset()
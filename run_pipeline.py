@@ -4,64 +4,113 @@ import sys
 import subprocess
 from pathlib import Path
 import shutil
+import tempfile
+import time
 
 # Direct function imports
-from etl.import_csv import import_from_excel
-from etl.export_csv import export_to_csv
-from etl.generate_html import generate_html
+from etl import dag, harvest_state, metrics, store
+from etl.import_csv import EXCEL_FILE, main as import_from_excel
+from etl.export_csv import export_csv
+from etl.generate_html import TEMPLATE_DIR, generate_html
 from etl.europepmc import fetch_publications
+from etl.import_openalex import harvest as harvest_openalex
 
-def run_script(script_path):
+PROJECT_ROOT = Path(__file__).resolve().parent
+ETL_DIR = PROJECT_ROOT / "etl"
+OUTPUT_DIR = PROJECT_ROOT / "output"
+WEB_ROOT = Path("/var/www/renew-publications")
+
+def run_script(script_path, env=None):
     print(f"🔄 Running: {script_path}")
-    result = subprocess.run([sys.executable, script_path])
+    result = subprocess.run([sys.executable, script_path], env=env)
     if result.returncode != 0:
-        print(f"❌ Error running {script_path}")
-        sys.exit(1)
+        raise RuntimeError(f"{script_path} exited with status {result.returncode}")
     print(f"✅ Completed: {script_path}")
 
-def main():
-    project_root = Path(__file__).resolve().parent
-    etl_dir = project_root / "etl"
-    output_dir = project_root / "output"
-    web_root = Path("/var/www/renew-publications")
-
-    print("🚀 Starting reNEW publication pipeline...")
+def import_openalex_isolated():
+    # Isolation mode: a crash or leak in the harvest cannot take the
+    # pipeline process down with it. The harvest leaves its metrics in a
+    # file, which are folded into this stage's.
+    with tempfile.TemporaryDirectory(prefix="renew-openalex-") as workdir:
+        path = os.path.join(workdir, "metrics.json")
+        try:
+            run_script(str(ETL_DIR / "import_openalex.py"), env=dict(os.environ, **{metrics.CHILD_METRICS_ENV: path}))
+        finally:
+            metrics.merge_child(path)
 
-    # Step 1: Import CSV (Excel)
-    print("📥 Importing Excel...")
-    import_from_excel()
+def deploy():
+    print(f"📂 Deploying output to {WEB_ROOT}")
+    os.makedirs(WEB_ROOT, exist_ok=True)
 
-    # Step 2: Import OpenAlex
-    run_script(str(etl_dir / "import_openalex.py"))
+    output_html = OUTPUT_DIR / "output.html"
+    output_csv = OUTPUT_DIR / "publications.csv"
 
-    # Step 3: Fetch from EuropePMC
-    print("🔍 Fetching from EuropePMC...")
-    fetch_publications()
+    if not output_html.exists() or not output_csv.exists():
+        raise RuntimeError("Output files missing. ETL step may have failed.")
 
-    # Step 4: Export combined data to CSV
-    print("📤 Exporting to CSV...")
-    export_to_csv()
+    shutil.copy(output_html, WEB_ROOT / "index.html")
+    shutil.copy(output_csv, WEB_ROOT / "publications.csv")
 
-    # Step 5: Generate HTML
-    print("🧾 Generating HTML...")
-    generate_html()
+# Environment settings that change what a stage fetches or writes
+HTTP_SETTINGS = ("HTTP_CACHE_REPLAY", "HTTP_CACHE_TTL")
+DATASET_SETTINGS = ("DATASET_CODEC", "DATASET_COMPRESSION")
 
-    # Step 6: Deploy to web root
-    print("📂 Deploying output to /var/www/renew-publications")
-    os.makedirs(web_root, exist_ok=True)
+def outputs_exist(*paths):
+    return lambda: all(Path(path).exists() for path in paths)
 
-    output_html = output_dir / "output.html"
-    output_csv = output_dir / "publications.csv"
+# The three sources are independent until they meet in the store, so they
+# run side by side; everything after the fan-in is a straight chain.
+# Each stage is skipped when its inputs match the last successful run. The
+# APIs cannot be hashed without calling them, so a harvest counts as
+# current for the rest of the day it ran, against the same endpoints and
+# settings; --force runs everything.
+def build_stages(isolate_openalex=False):
+    return [
+        dag.Stage("excel", import_from_excel,
+                  inputs=lambda: {"code": dag.code_digest(ETL_DIR / "import_csv.py"), "workbook": dag.file_digest(EXCEL_FILE)},
+                  check=lambda: store.has_source("Excel")),
+        dag.Stage("openalex", import_openalex_isolated if isolate_openalex else harvest_openalex,
+                  inputs=lambda: {"code": dag.code_digest(ETL_DIR / "import_openalex.py"), "day": harvest_state.today(),
+                                  "env": dag.env_inputs("OPENALEX_API_URL", "OPENALEX_API_KEY", *HTTP_SETTINGS)},
+                  check=lambda: store.has_source("OpenAlex")),
+        dag.Stage("europepmc", fetch_publications,
+                  inputs=lambda: {"code": dag.code_digest(ETL_DIR / "europepmc.py"), "day": harvest_state.today(),
+                                  "env": dag.env_inputs("EUROPEPMC_SEARCH_URL", *HTTP_SETTINGS)},
+                  check=lambda: store.has_source("EuropePMC")),
+        dag.Stage("export", export_csv, deps=("excel", "openalex", "europepmc"),
+                  inputs=lambda: {"code": dag.code_digest(ETL_DIR / "export_csv.py"), "store": store.content_digest(),
+                                  "env": dag.env_inputs(*DATASET_SETTINGS)},
+                  check=outputs_exist(OUTPUT_DIR / "publications.csv", store.EXPORT_PATH, store.DATASET_PATH)),
+        dag.Stage("render", generate_html, deps=("export",),
+                  inputs=lambda: {"code": dag.code_digest(ETL_DIR / "generate_html.py"),
+                                  "templates": dag.dir_digest(TEMPLATE_DIR),
+                                  "dataset": dag.file_digest(store.DATASET_PATH),
+                                  "skipped": dag.file_digest(OUTPUT_DIR / "skipped_entries.json")},
+                  check=outputs_exist(OUTPUT_DIR / "output.html")),
+        dag.Stage("deploy", deploy, deps=("render",),
+                  inputs=lambda: {"code": dag.file_digest(__file__),
+                                  "html": dag.file_digest(OUTPUT_DIR / "output.html"),
+                                  "csv": dag.file_digest(OUTPUT_DIR / "publications.csv")},
+                  check=outputs_exist(WEB_ROOT / "index.html", WEB_ROOT / "publications.csv")),
+    ]
 
-    if not output_html.exists() or not output_csv.exists():
-        print("❌ Output files missing. ETL step may have failed.")
+def main(force=False, isolate_openalex=False):
+    print("🚀 Starting reNEW publication pipeline...")
+    stages = build_stages(isolate_openalex)
+    started = time.time()
+    try:
+        timeline = dag.run(stages, force=force)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        metrics.write_report(started, time.time() - started)
         sys.exit(1)
-
-    shutil.copy(output_html, web_root / "index.html")
-    shutil.copy(output_csv, web_root / "publications.csv")
+    dag.print_timeline(stages, timeline)
+    metrics.write_report(started, time.time() - started)
 
     print("✅ Pipeline complete.")
     print("🌐 View live at: https://publication.renew-platforms.dk")
 
 if __name__ == "__main__":
-    main()
+    # --force: run every stage even when its inputs are unchanged
+    # --isolate-openalex: run the OpenAlex harvest in its own interpreter
+    main(force="--force" in sys.argv, isolate_openalex="--isolate-openalex" in sys.argv)